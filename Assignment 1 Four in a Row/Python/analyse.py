@@ -0,0 +1,184 @@
+from heuristics import Heuristic, SimpleHeuristic
+from players import MinMaxPlayer
+from board import Board
+from app import winning
+from records import encode_moves, decode_moves, board_from_moves, read_records
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, Iterator, List, TextIO, Tuple
+import argparse
+import os
+import sys
+
+
+ENGINES: List[str] = ['minmax', 'heuristic']
+
+
+def analyse_position(record: str, width: int, height: int, settings: Dict) -> Tuple[str, str]:
+    """Determines the best move and its value for the player to move
+
+    Args:
+        record (str): the move sequence played so far, player 1 moving first
+        width (int): width of the board
+        height (int): height of the board
+        settings (Dict): game_n, engine and depth to use
+
+    Returns:
+        Tuple[str, str]: the best move in move sequence notation and its value,
+                         '-' for a finished game and 'invalid' for an impossible position
+    """
+    game_n: int = settings['game_n']
+    try:
+        moves: List[int] = decode_moves(record)
+        board: Board = board_from_moves(moves, width, height)
+    except ValueError:
+        return 'invalid', '-'
+
+    player_id: int = 1 + len(moves) % 2
+    heuristic: Heuristic = SimpleHeuristic(game_n)
+    if winning(board.get_board_state(), game_n) != 0:
+        return '-', str(heuristic.evaluate_board(player_id, board))
+
+    if settings['engine'] == 'minmax':
+        player: MinMaxPlayer = MinMaxPlayer(player_id, game_n, settings['depth'], heuristic)
+        move: int = player.make_move(board)
+        return encode_moves([move]), str(player.last_value)
+
+    move = int(heuristic.get_best_action(player_id, board))
+    return encode_moves([move]), str(heuristic.evaluate_board(player_id, board.get_new_board(move, player_id)))
+
+
+def analyse_chunk(positions: List[Tuple[str, int, int]], settings: Dict) -> List[str]:
+    """Analyses a chunk of positions, runs inside a worker process
+
+    Args:
+        positions (List[Tuple[str, int, int]]): move sequence, width and height of every position
+        settings (Dict): game_n, engine and depth to use
+
+    Returns:
+        List[str]: an output line for every position
+    """
+    lines: List[str] = []
+    for record, width, height in positions:
+        best, value = analyse_position(record, width, height, settings)
+        lines.append(f'{record}\t{best}\t{value}')
+    return lines
+
+
+def read_positions(path: str, binary: bool, width: int, height: int) -> Iterator[Tuple[str, int, int]]:
+    """Streams the positions in a file
+
+    Args:
+        path (str): the file, either one move sequence per line or binary game records
+        binary (bool): true if the file contains binary game records
+        width (int): width of the board for move sequence files
+        height (int): height of the board for move sequence files
+
+    Yields:
+        Tuple[str, int, int]: move sequence, width and height of every position
+    """
+    if binary:
+        with open(path, 'rb') as file:
+            for moves, record_width, record_height in read_records(file):
+                yield encode_moves(moves), record_width, record_height
+        return
+
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'): # empty and comment lines are skipped
+                yield line, width, height
+
+
+def run_analysis(positions: Iterator[Tuple[str, int, int]], output: TextIO, executor: Executor,
+                 settings: Dict, chunk_size: int, max_in_flight: int) -> int:
+    """Streams positions through a worker pool and writes the results in input order
+    At most max_in_flight chunks are submitted at once, so the input is never read far ahead of the output
+
+    Args:
+        positions (Iterator[Tuple[str, int, int]]): move sequence, width and height of every position
+        output (TextIO): where to write the results
+        executor (Executor): the worker pool
+        settings (Dict): game_n, engine and depth to use
+        chunk_size (int): number of positions per task
+        max_in_flight (int): max number of submitted tasks without a written result
+
+    Returns:
+        int: the number of analysed positions
+    """
+    in_flight: Deque[Future] = deque()
+    count: int = 0
+
+    while chunk := list(islice(positions, chunk_size)):
+        if len(in_flight) >= max_in_flight:
+            count += _write(in_flight.popleft().result(), output)
+        in_flight.append(executor.submit(analyse_chunk, chunk, settings))
+
+    while in_flight:
+        count += _write(in_flight.popleft().result(), output)
+    return count
+
+
+def _write(lines: List[str], output: TextIO) -> int:
+    """
+    Args:
+        lines (List[str]): result lines
+        output (TextIO): where to write the lines
+
+    Returns:
+        int: number of lines written
+    """
+    for line in lines:
+        output.write(line + '\n')
+    return len(lines)
+
+
+def parse_arguments(argv: List[str]) -> argparse.Namespace:
+    """
+    Args:
+        argv (List[str]): command line arguments
+
+    Returns:
+        argparse.Namespace: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Analyse a file of n in a row positions and write the best moves')
+    parser.add_argument('input', help='file with one move sequence per line (e.g. 4453) or binary game records')
+    parser.add_argument('-o', '--output', help='output file, standard output if not given')
+    parser.add_argument('--binary', action='store_true', help='the input contains binary game records')
+    parser.add_argument('--engine', choices=ENGINES, default='minmax', help='player or heuristic to use')
+    parser.add_argument('--depth', type=int, default=4, help='search depth of the minmax player')
+    parser.add_argument('--game-n', type=int, default=4, help='n in a row required to win')
+    parser.add_argument('--width', type=int, default=7, help='width of the board for move sequence files')
+    parser.add_argument('--height', type=int, default=6, help='height of the board for move sequence files')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=16, help='positions per task')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='max tasks waiting for a result, twice the workers by default')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> None:
+    """Entry point of the command line interface
+
+    Args:
+        argv (List[str]): command line arguments
+    """
+    args: argparse.Namespace = parse_arguments(argv)
+    settings: Dict = {'game_n': args.game_n, 'engine': args.engine, 'depth': args.depth}
+    positions: Iterator[Tuple[str, int, int]] = read_positions(args.input, args.binary, args.width, args.height)
+
+    output: TextIO = open(args.output, 'w') if args.output else sys.stdout
+    workers: int = args.workers or os.cpu_count() or 1
+    max_in_flight: int = args.max_in_flight or 2 * workers
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            count: int = run_analysis(positions, output, executor, settings, args.chunk_size, max_in_flight)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f'Analysed {count} positions', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+from heuristics import SimpleHeuristic
+from players import MinMaxPlayer
+from gametree import GameTree
+from board import Board
+from app import winning
+from typing import Dict, List
+from statistics import mean
+import time
+
+
+def run_benchmark(game_n: int, width: int, height: int, depth: int) -> Dict[str, List[float]]:
+    """Plays a game between two minmax players and measures every move
+
+    Args:
+        game_n (int): n in a row required to win
+        width (int): width of the board
+        height (int): height of the board
+        depth (int): the max search depth of both players
+
+    Returns:
+        Dict[str, List[float]]: per move measurements
+    """
+    players: List[MinMaxPlayer] = [
+        MinMaxPlayer(1, game_n, depth, SimpleHeuristic(game_n)),
+        MinMaxPlayer(2, game_n, depth, SimpleHeuristic(game_n))
+    ]
+    board: Board = Board(width, height)
+    results: Dict[str, List[float]] = {'seconds': [], 'nodes': [], 'retained': [], 'bytes': [], 'fast': []}
+
+    current_player_index: int = 0
+    winner: int = 0
+    while winner == 0:
+        current_player: MinMaxPlayer = players[current_player_index]
+
+        fast_moves: int = current_player.fast_move_count
+        start: float = time.perf_counter()
+        move: int = current_player.make_move(board)
+        results['seconds'].append(time.perf_counter() - start)
+        results['fast'].append(current_player.fast_move_count - fast_moves)
+        results['nodes'].append(len(current_player.tree))
+        results['retained'].append(current_player.tree.retained)
+        results['bytes'].append(current_player.tree.nbytes())
+
+        board.play(move, current_player.player_id)
+        current_player_index = 1 - current_player_index
+        winner = winning(board.get_board_state(), game_n)
+
+    return results
+
+
+def print_benchmark_summary(results: Dict[str, List[float]], bytes_per_node: int) -> None:
+    """Prints a formatted summary of the benchmark
+
+    Args:
+        results (Dict[str, List[float]]): per move measurements of run_benchmark
+        bytes_per_node (int): memory needed to store a single node
+    """
+    print('\n--- Game Tree Benchmark ---')
+    print(f'Moves played: {len(results["seconds"])}')
+    print(f'  - Average / Max time per move: {mean(results["seconds"]) * 1000:,.1f} / {max(results["seconds"]) * 1000:,.1f} ms')
+    print(f'  - Moves decided by threat analysis without a search: {sum(results["fast"]):,.0f}')
+    print(f'  - Average / Max nodes in tree: {mean(results["nodes"]):,.0f} / {max(results["nodes"]):,}')
+    print(f'  - Average nodes retained from the previous move: {mean(results["retained"]):,.0f}')
+    print(f'  - Memory per node: {bytes_per_node} bytes')
+    print(f'  - Max memory of the node arrays (including spare capacity): {max(results["bytes"]) / 1024:,.1f} KiB')
+    print('\n--- End of Benchmark ---')
+
+
+if __name__ == '__main__':
+    game_n: int = 4 # n in a row required to win
+    width: int = 7  # width of the board
+    height: int = 6 # height of the board
+    depth: int = 4  # search depth of the players
+
+    results: Dict[str, List[float]] = run_benchmark(game_n, width, height, depth)
+    print_benchmark_summary(results, GameTree().bytes_per_node())
@@ -0,0 +1,272 @@
+from __future__ import annotations
+import numpy as np
+from typing import List
+
+
+class TreeNode:
+    """A lightweight view on a single node of a GameTree
+    The node data itself lives in the arrays of the tree, this object only holds an index
+    """
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: GameTree, index: int) -> None:
+        """
+        Args:
+            tree (GameTree): tree the node belongs to
+            index (int): index of the node in the arrays of the tree
+        """
+        self.tree: GameTree = tree
+        self.index: int = index
+
+
+    @property
+    def parent(self) -> TreeNode | None:
+        """
+        Returns:
+            TreeNode | None: the parent of this node, or None for the root
+        """
+        parent: int = int(self.tree.parent[self.index])
+        return None if parent < 0 else TreeNode(self.tree, parent)
+
+
+    @property
+    def move(self) -> int:
+        """
+        Returns:
+            int: column played to reach this node from its parent, -1 for the root
+        """
+        return int(self.tree.move[self.index])
+
+
+    @property
+    def value(self) -> int:
+        """
+        Returns:
+            int: the last value stored for this node
+        """
+        return int(self.tree.value[self.index])
+
+
+    @property
+    def children(self) -> List[TreeNode]:
+        """
+        Returns:
+            List[TreeNode]: the children of this node, empty if the node is not expanded
+        """
+        return [TreeNode(self.tree, i) for i in self.tree.children(self.index)]
+
+
+    def is_expanded(self) -> bool:
+        """
+        Returns:
+            bool: true if the children of this node have been generated
+        """
+        return self.tree.is_expanded(self.index)
+
+
+class GameTree:
+    """A game tree stored as parallel arrays
+    Every node is a row in the arrays. The children of a node are stored next to each other,
+    so a node only needs the index of its first child and the number of children.
+    Boards are not stored in the tree, they are rebuilt by replaying the moves from the root.
+    """
+    def __init__(self, capacity: int = 1024) -> None:
+        """Creates a tree containing only the root node
+
+        Args:
+            capacity (int): number of nodes to allocate memory for, the arrays grow when needed
+        """
+        self.parent: np.ndarray = np.full(capacity, -1, dtype=np.int32)
+        self.move: np.ndarray = np.full(capacity, -1, dtype=np.int8)
+        self.value: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self.child_start: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self.child_count: np.ndarray = np.full(capacity, -1, dtype=np.int8) # -1 = not expanded
+        self.size: int = 1 # the root node
+        self.retained: int = 0 # number of nodes kept by the last reroot
+
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            int: the number of nodes in the tree
+        """
+        return self.size
+
+
+    @property
+    def root(self) -> TreeNode:
+        """
+        Returns:
+            TreeNode: the root of the tree, always stored at index 0
+        """
+        return TreeNode(self, 0)
+
+
+    def node(self, index: int) -> TreeNode:
+        """
+        Args:
+            index (int): index of the node
+
+        Returns:
+            TreeNode: a view on the node at the provided index
+        """
+        return TreeNode(self, index)
+
+
+    def is_expanded(self, index: int) -> bool:
+        """
+        Args:
+            index (int): index of the node
+
+        Returns:
+            bool: true if the children of the node have been generated
+        """
+        return self.child_count[index] >= 0
+
+
+    def children(self, index: int) -> range:
+        """
+        Args:
+            index (int): index of the node
+
+        Returns:
+            range: indices of the children of the node
+        """
+        start: int = int(self.child_start[index])
+        return range(start, start + max(int(self.child_count[index]), 0))
+
+
+    def expand(self, index: int, moves: List[int]) -> None:
+        """Generates a child for every provided move of a node
+
+        Args:
+            index (int): index of the node to expand
+            moves (List[int]): the columns that can be played from the node
+        """
+        start: int = self._allocate(len(moves))
+        end: int = start + len(moves)
+        self.parent[start:end] = index
+        self.move[start:end] = moves
+        self.child_count[start:end] = -1
+        self.child_start[index] = start
+        self.child_count[index] = len(moves)
+
+
+    def reroot(self, moves: List[int]) -> bool:
+        """Makes the node reached by playing the provided moves the new root
+        Only the subtree below that node is kept, everything else is discarded
+
+        Args:
+            moves (List[int]): columns played since the root, in order
+
+        Returns:
+            bool: true if the subtree was kept, false if the tree was reset to a single root
+        """
+        new_root: int = 0
+        for col in moves:
+            for child in self.children(new_root):
+                if self.move[child] == col:
+                    new_root = child
+                    break
+            else:
+                self._reset()
+                return False
+
+        # Collect the subtree level by level, siblings stay next to each other in this order
+        levels: List[np.ndarray] = []
+        level: np.ndarray = np.array([new_root], dtype=np.int32)
+        while level.size:
+            levels.append(level)
+            counts: np.ndarray = np.maximum(self.child_count[level], 0).astype(np.int32)
+            offsets: np.ndarray = np.cumsum(counts) - counts
+            level = (np.repeat(self.child_start[level] - offsets, counts)
+                     + np.arange(counts.sum(), dtype=np.int32)).astype(np.int32)
+        order: np.ndarray = np.concatenate(levels)
+
+        new_index: np.ndarray = np.full(self.size, -1, dtype=np.int32)
+        new_index[order] = np.arange(order.size, dtype=np.int32)
+
+        expanded: np.ndarray = self.child_count[order] > 0
+        child_start: np.ndarray = np.zeros(order.size, dtype=np.int32)
+        child_start[expanded] = new_index[self.child_start[order][expanded]]
+
+        parent: np.ndarray = self.parent[order]
+        parent[0] = -1
+        parent[1:] = new_index[parent[1:]]
+
+        capacity: int = max(order.size * 2, 1024)
+        self.parent = self._resized(parent, capacity, -1)
+        self.move = self._resized(self.move[order], capacity, -1)
+        self.value = self._resized(self.value[order], capacity, 0)
+        self.child_start = self._resized(child_start, capacity, 0)
+        self.child_count = self._resized(self.child_count[order], capacity, -1)
+        self.move[0] = -1
+        self.size = order.size
+        self.retained = order.size
+        return True
+
+
+    def nbytes(self) -> int:
+        """
+        Returns:
+            int: memory used by the node arrays, including unused capacity
+        """
+        return sum(a.nbytes for a in (self.parent, self.move, self.value, self.child_start, self.child_count))
+
+
+    def bytes_per_node(self) -> int:
+        """
+        Returns:
+            int: memory needed to store a single node
+        """
+        return sum(a.itemsize for a in (self.parent, self.move, self.value, self.child_start, self.child_count))
+
+
+    def _allocate(self, n: int) -> int:
+        """Reserves room for n new nodes, growing the arrays if needed
+
+        Args:
+            n (int): number of nodes to reserve
+
+        Returns:
+            int: index of the first reserved node
+        """
+        start: int = self.size
+        if start + n > self.parent.size:
+            capacity: int = max(self.parent.size * 2, start + n)
+            self.parent = self._resized(self.parent, capacity, -1)
+            self.move = self._resized(self.move, capacity, -1)
+            self.value = self._resized(self.value, capacity, 0)
+            self.child_start = self._resized(self.child_start, capacity, 0)
+            self.child_count = self._resized(self.child_count, capacity, -1)
+        self.size += n
+        return start
+
+
+    def _reset(self) -> None:
+        """Discards every node except for a fresh root
+        """
+        self.parent[0] = -1
+        self.move[0] = -1
+        self.value[0] = 0
+        self.child_start[0] = 0
+        self.child_count[0] = -1
+        self.size = 1
+        self.retained = 0
+
+
+    @staticmethod
+    def _resized(array: np.ndarray, capacity: int, fill: int) -> np.ndarray:
+        """Copies an array into a new array of the provided capacity
+
+        Args:
+            array (np.ndarray): array to copy
+            capacity (int): size of the new array
+            fill (int): value for the entries after the copied data
+
+        Returns:
+            np.ndarray: the new array
+        """
+        new: np.ndarray = np.full(capacity, fill, dtype=array.dtype)
+        new[:array.size] = array[:capacity]
+        return new
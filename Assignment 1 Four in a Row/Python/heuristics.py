@@ -1,8 +1,9 @@
 from __future__ import annotations
 import numpy as np
+import json
 from abc import abstractmethod
 from numba import jit
-from typing import TYPE_CHECKING
+from typing import Dict, List, Tuple, TYPE_CHECKING
 if TYPE_CHECKING:
     from board import Board
 
@@ -29,8 +30,7 @@ class Heuristic:
         Returns:
             int: column with the best heuristic value
         """
-        min_util: int = -max(board.get_board_state().shape)
-        utils: np.ndarray = np.full(board.width, min_util - 1, dtype=int)
+        utils: np.ndarray = np.full(board.width, np.iinfo(np.int64).min, dtype=np.int64) # invalid columns are never chosen
 
         for i in range(board.width):
             if board.is_valid(i):
@@ -53,6 +53,20 @@ class Heuristic:
         self.eval_count += 1
         state: np.ndarray = board.get_board_state()
         return self._evaluate(player_id, state, self.winning(state, self.game_n))
+
+
+    def evaluate_boards(self, player_id: int, boards: List[Board]) -> np.ndarray:
+        """Assigns a utility to many boards at once
+        Heuristics that can score a whole batch in one vectorized call override this
+
+        Args:
+            player_id (int): the player for which to compute the heuristic value
+            boards (List[Board]): the boards to evaluate
+
+        Returns:
+            np.ndarray: the utility of every board
+        """
+        return np.array([self.evaluate_board(player_id, board) for board in boards], dtype=np.int64)
     
 
     @staticmethod
@@ -181,3 +195,164 @@ class SimpleHeuristic(Heuristic):
                         break
 
         return max_in_row
+
+
+class PatternHeuristic(Heuristic):
+    """A linear heuristic over window patterns
+    Every line of n fields on the board is a window. A window that holds k pieces of one player
+    and none of the other is an open threat of size k for that player. The utility is a weighted sum
+    of the number of open threats of every size for both players, plus the pieces in the center column.
+    Inherits from Heuristic
+    """
+    WIN_SCORE: int = 1_000_000 # utility of a won game, larger than any pattern score
+
+    def __init__(self, game_n: int, weights: np.ndarray | None = None) -> None:
+        """
+        Args:
+            game_n (int): n in a row required to win
+            weights (np.ndarray | None): one weight per feature, see features. Uses hand picked weights if None
+        """
+        super().__init__(game_n)
+        self.weights: np.ndarray = self.default_weights(game_n) if weights is None else np.asarray(weights, dtype=float)
+        self._windows: Dict[Tuple[int, int], np.ndarray] = {} # window field indices per board shape
+        assert self.weights.shape == (2 * game_n,), 'PatternHeuristic needs 2 * game_n weights'
+
+
+    @classmethod
+    def from_file(cls, path: str) -> PatternHeuristic:
+        """Creates the heuristic with weights written by tune_pattern_heuristic.py
+
+        Args:
+            path (str): path to the json file with the fields game_n and weights
+
+        Returns:
+            PatternHeuristic: the heuristic
+        """
+        with open(path, 'r') as file:
+            data: Dict = json.load(file)
+        return cls(data['game_n'], np.array(data['weights']))
+
+
+    @staticmethod
+    def default_weights(game_n: int) -> np.ndarray:
+        """
+        Args:
+            game_n (int): n in a row required to win
+
+        Returns:
+            np.ndarray: hand picked weights, threats growing tenfold in value with every extra piece
+        """
+        threats: np.ndarray = 10.0 ** np.arange(game_n - 1)
+        return np.concatenate((threats, -threats, [3.0, -3.0]))
+
+
+    def _name(self) -> str:
+        """
+        Returns:
+            str: the name of the heuristic; Pattern
+        """
+        return 'Pattern'
+
+
+    def features(self, player_id: int, states: np.ndarray) -> np.ndarray:
+        """Extracts the features of a batch of board states in one vectorized pass
+
+        Args:
+            player_id (int): the player for which to compute the features
+            states (np.ndarray): board states with shape (batch, width, height)
+
+        Returns:
+            np.ndarray: features with shape (batch, 2 * game_n): the number of open threats of size
+                        1 to n - 1 of the player, the same for the opponent, and the pieces of the player
+                        and of the opponent in the center column
+        """
+        batch, width, height = states.shape
+        flat: np.ndarray = states.reshape(batch, width * height)
+        windows: np.ndarray = flat[:, self._window_indices(width, height)] # (batch, windows, n)
+
+        own: np.ndarray = (windows == player_id).sum(axis=2)
+        other: np.ndarray = ((windows != player_id) & (windows != 0)).sum(axis=2)
+        sizes: np.ndarray = np.arange(1, self.game_n)[:, None, None] # (n - 1, 1, 1)
+
+        own_threats: np.ndarray = ((own == sizes) & (other == 0)).sum(axis=2).T
+        other_threats: np.ndarray = ((other == sizes) & (own == 0)).sum(axis=2).T
+        center: np.ndarray = states[:, width // 2]
+        return np.column_stack((
+            own_threats, other_threats,
+            (center == player_id).sum(axis=1), ((center != player_id) & (center != 0)).sum(axis=1)
+        )).astype(float)
+
+
+    def evaluate_boards(self, player_id: int, boards: List[Board]) -> np.ndarray:
+        """Assigns a utility to many boards with a single batched computation
+
+        Args:
+            player_id (int): the player for which to compute the heuristic value
+            boards (List[Board]): the boards to evaluate
+
+        Returns:
+            np.ndarray: the utility of every board
+        """
+        if not boards:
+            return np.zeros(0, dtype=np.int64)
+        self.eval_count += len(boards)
+        states: np.ndarray = np.stack([board.board_state for board in boards])
+        winners: np.ndarray = np.array([self.winning(state, self.game_n) for state in states])
+        return self._evaluate_batch(player_id, states, winners)
+
+
+    def _evaluate(self, player_id: int, state: np.ndarray, winner: int) -> int:
+        """Determine utility of a board state
+
+        Args:
+            player_id (int): the player for which to compute the heuristic value
+            state (np.ndarray): the board to check
+            winner (int): 1 or 2 if the respective player won, -1 if the game is a draw, 0 otherwise
+
+        Returns:
+            int: heuristic value for the board state
+        """
+        return int(self._evaluate_batch(player_id, state[None], np.array([winner]))[0])
+
+
+    def _evaluate_batch(self, player_id: int, states: np.ndarray, winners: np.ndarray) -> np.ndarray:
+        """Determine the utility of a batch of board states
+
+        Args:
+            player_id (int): the player for which to compute the heuristic value
+            states (np.ndarray): board states with shape (batch, width, height)
+            winners (np.ndarray): the winner of every board state, see Heuristic.winning
+
+        Returns:
+            np.ndarray: heuristic value for every board state
+        """
+        utils: np.ndarray = np.rint(self.features(player_id, states) @ self.weights).astype(np.int64)
+        utils = np.clip(utils, 1 - self.WIN_SCORE, self.WIN_SCORE - 1)
+        utils[winners == player_id] = self.WIN_SCORE
+        utils[winners < 0] = 0
+        utils[(winners > 0) & (winners != player_id)] = -self.WIN_SCORE
+        return utils
+
+
+    def _window_indices(self, width: int, height: int) -> np.ndarray:
+        """Gets the indices of the fields of every window in a flattened board state
+
+        Args:
+            width (int): width of the board
+            height (int): height of the board
+
+        Returns:
+            np.ndarray: field indices with shape (windows, n)
+        """
+        if (width, height) not in self._windows:
+            steps: np.ndarray = np.arange(self.game_n)
+            windows: List[np.ndarray] = []
+            for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)): # horizontal, vertical, both diagonals
+                for col in range(width):
+                    for row in range(height):
+                        cols: np.ndarray = col + dc * steps
+                        rows: np.ndarray = row + dr * steps
+                        if cols[-1] < width and 0 <= rows[-1] < height:
+                            windows.append(cols * height + rows)
+            self._windows[(width, height)] = np.array(windows, dtype=np.intp).reshape(-1, self.game_n)
+        return self._windows[(width, height)]
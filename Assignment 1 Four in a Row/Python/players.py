@@ -1,12 +1,21 @@
 from __future__ import annotations
 from abc import abstractmethod
 import numpy as np
-from typing import TYPE_CHECKING
+from gametree import GameTree
+from threats import ThreatAnalysis, analyse_threats, non_losing_moves
+from typing import List, Tuple, TYPE_CHECKING
+import time
 if TYPE_CHECKING:
     from heuristics import Heuristic
     from board import Board
 
 
+class SearchTimeout(Exception):
+    """Raised when a search passes the deadline of the player
+    """
+    pass
+
+
 class PlayerController:
     """Abstract class defining a player
     """
@@ -57,6 +66,8 @@ class MinMaxPlayer(PlayerController):
     """Class for the minmax player using the minmax algorithm
     Inherits from Playercontroller
     """
+    FRONTIER_BATCH: int = 4096 # max number of leaves scored in a single call to the heuristic
+
     def __init__(self, player_id: int, game_n: int, depth: int, heuristic: Heuristic) -> None:
         """
         Args:
@@ -67,41 +78,136 @@ class MinMaxPlayer(PlayerController):
         """
         super().__init__(player_id, game_n, heuristic)
         self.depth: int = depth
+        self.tree: GameTree = GameTree()
+        self._root_state: np.ndarray | None = None # board state at the root of the tree
+        self.fast_move_count: int = 0 # moves decided by the threat analysis, without a search
+        self.last_value: int = 0 # value of the last chosen move
+        self.deadline: float | None = None # time.perf_counter() value after which a search is aborted
 
 
     def make_move(self, board: Board) -> int:
         """Gets the column for the player to play in
+        The game tree of the previous move is kept, so only the new deepest level has to be generated.
+        Immediate wins and moves that block an immediate loss are played without searching
 
         Args:
             board (Board): the current board
 
+        Raises:
+            SearchTimeout: if the deadline passes during the search, the tree is kept for the next call
+
         Returns:
             int: column to play in
         """
+        self._update_tree(board)
+
+        threats: ThreatAnalysis = analyse_threats(board, self.player_id, self.game_n)
+        if threats.winning or threats.forced:
+            self.fast_move_count += 1
+            move: int = (threats.winning or threats.forced)[0]
+            self.last_value = self.heuristic.evaluate_board(self.player_id, board.get_new_board(move, self.player_id))
+            return move
+
+        self._minmax(board)
+
+        best_child: int = max(self.tree.children(0), key=lambda child: self.tree.value[child])
+        self.last_value = int(self.tree.value[best_child])
+        return int(self.tree.move[best_child])
+
+
+    def _search(self, node: int, board: Board, depth: int, maximizing: bool) -> None:
+        """Expands the game tree below a node
+        The leaves are not scored right away but collected, so the frontier can be scored in large batches
+
+        Args:
+            node (int): index of the node in the game tree
+            board (Board): the board belonging to the node
+            depth (int): the remaining search depth
+            maximizing (bool): true if it is this player's turn at the node
+        """
+        if depth == 0 or self.heuristic.winning(board.board_state, self.game_n) != 0:
+            self.tree.value[node] = self.heuristic.evaluate_board(self.player_id, board)
+            return
+
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        player_id: int = self.player_id if maximizing else 3 - self.player_id
+        if not self.tree.is_expanded(node):
+            self.tree.expand(node, non_losing_moves(board, player_id, self.game_n))
+
+        children: range = self.tree.children(node)
+        if depth == 1: # the children are leaves
+            self._frontier_nodes.append(children)
+            self._frontier_boards.extend(board.get_new_board(int(self.tree.move[child]), player_id) for child in children)
+            if len(self._frontier_boards) >= self.FRONTIER_BATCH:
+                self._score_frontier()
+        else:
+            for child in children:
+                self._search(child, board.get_new_board(int(self.tree.move[child]), player_id), depth - 1, not maximizing)
+        self._inner_nodes.append((node, maximizing)) # children always come before their parent
+
+
+    def _score_frontier(self) -> None:
+        """Scores all collected leaves with a single call to the heuristic
+        """
+        values: np.ndarray = self.heuristic.evaluate_boards(self.player_id, self._frontier_boards)
+        offset: int = 0
+        for children in self._frontier_nodes:
+            self.tree.value[children.start:children.stop] = values[offset:offset + len(children)]
+            offset += len(children)
+        self._frontier_nodes = []
+        self._frontier_boards = []
+
+
+    def _minmax(self, board: Board) -> None:
+        """Computes the minmax value of every node in the game tree up to the search depth
+
+        Args:
+            board (Board): the board belonging to the root of the tree
+        """
+        self._frontier_nodes: List[range] = []
+        self._frontier_boards: List[Board] = []
+        self._inner_nodes: List[Tuple[int, bool]] = []
+
+        self._search(0, board, self.depth, True)
+        self._score_frontier()
+
+        # Propagate the values up the tree
+        for node, maximizing in self._inner_nodes:
+            children: range = self.tree.children(node)
+            values: np.ndarray = self.tree.value[children.start:children.stop]
+            self.tree.value[node] = values.max() if maximizing else values.min()
+
+
+    def _update_tree(self, board: Board) -> None:
+        """Moves the root of the game tree to the current board
+        The subtree below the moves played since the last call is kept, if those moves can be determined
+
+        Args:
+            board (Board): the current board
+        """
+        state: np.ndarray = board.get_board_state()
+        moves: List[int] | None = None
+
+        if self._root_state is not None and self._root_state.shape == state.shape:
+            changed: np.ndarray = self._root_state != state
+            own_cols: np.ndarray = np.nonzero(np.any(changed & (state == self.player_id), axis=1))[0]
+            other_cols: np.ndarray = np.nonzero(np.any(changed & (state == 3 - self.player_id), axis=1))[0]
+
+            # The board only grows, and this player moved first after the previous root
+            if np.all(self._root_state[changed] == 0):
+                if changed.sum() == 0:
+                    moves = []
+                elif changed.sum() == 2 and len(own_cols) == 1 and len(other_cols) == 1:
+                    moves = [int(own_cols[0]), int(other_cols[0])]
+
+        if moves is None:
+            self.tree = GameTree()
+        else:
+            self.tree.reroot(moves) # resets the tree if the moves were not in it
+        self._root_state = state
 
-        # TODO: implement minmax algortihm!
-        # INT: use the functions on the 'board' object to produce a new board given a specific move
-        # HINT: use the functions on the 'heuristic' object to produce evaluations for the different board states!
-        
-        # Example:
-        max_value: float = -np.inf # negative infinity
-        max_move: int = 0
-        for col in range(board.width):
-            if board.is_valid(col):
-                new_board: Board = board.get_new_board(col, self.player_id)
-                value: int = self.heuristic.evaluate_board(self.player_id, new_board)
-                if value > max_value:
-                    max_move = col
-
-        # This returns the same as
-        self.heuristic.get_best_action(self.player_id, board) # Very useful helper function!
-
-        # This is obviously not enough (this is depth 1)
-        # Your assignment is to create a data structure (tree) to store the gameboards such that you can evaluate a higher depths.
-        # Then, use the minmax algorithm to search through this tree to find the best move/action to take!
-
-        return max_move
-    
 
 class AlphaBetaPlayer(PlayerController):
     """Class for the minmax player using the minmax algorithm with alpha-beta pruning
@@ -0,0 +1,147 @@
+from board import Board
+from typing import BinaryIO, Iterator, List, Tuple
+import numpy as np
+import struct
+
+
+MOVE_CHARACTERS: str = '123456789abcdefghijklmnopqrstuvwxyz' # column 0 is written as '1'
+RECORD_HEADER: struct.Struct = struct.Struct('<BBH') # width, height, number of moves
+
+
+def encode_moves(moves: List[int]) -> str:
+    """Encodes a sequence of moves as a string, one character per move
+
+    Args:
+        moves (List[int]): the columns played, player 1 moving first
+
+    Returns:
+        str: the move sequence, e.g. '4453'
+    """
+    return ''.join(MOVE_CHARACTERS[col] for col in moves)
+
+
+def decode_moves(record: str) -> List[int]:
+    """Decodes a move sequence string
+
+    Args:
+        record (str): the move sequence, e.g. '4453'
+
+    Raises:
+        ValueError: if the string contains an unknown character
+
+    Returns:
+        List[int]: the columns played
+    """
+    try:
+        return [MOVE_CHARACTERS.index(char) for char in record.strip().lower()]
+    except ValueError:
+        raise ValueError(f'Invalid move sequence: {record!r}') from None
+
+
+def board_from_moves(moves: List[int], width: int, height: int) -> Board:
+    """Plays a sequence of moves on an empty board, player 1 moving first
+
+    Args:
+        moves (List[int]): the columns played
+        width (int): width of the board
+        height (int): height of the board
+
+    Raises:
+        ValueError: if a move is played outside the board or in a full column
+
+    Returns:
+        Board: the resulting board
+    """
+    board: Board = Board(width, height)
+    for i, col in enumerate(moves):
+        if not 0 <= col < width or not board.play(col, 1 + i % 2):
+            raise ValueError(f'Move {i + 1} in column {col + 1} is not possible')
+    return board
+
+
+def pack_moves(moves: List[int], width: int, height: int) -> bytes:
+    """Packs a game into a binary record
+    The record is a header followed by the moves, using 4 bits per move for boards of up to 16 columns
+
+    Args:
+        moves (List[int]): the columns played
+        width (int): width of the board
+        height (int): height of the board
+
+    Returns:
+        bytes: the binary record
+    """
+    cols: np.ndarray = np.asarray(moves, dtype=np.uint8)
+    if width <= 16:
+        if cols.size % 2:
+            cols = np.append(cols, np.zeros(1, dtype=np.uint8))
+        cols = (cols[0::2] << 4) | cols[1::2]
+    return RECORD_HEADER.pack(width, height, len(moves)) + cols.tobytes()
+
+
+def unpack_moves(record: bytes) -> Tuple[List[int], int, int]:
+    """Unpacks a binary record created by pack_moves
+
+    Args:
+        record (bytes): the binary record
+
+    Returns:
+        Tuple[List[int], int, int]: the columns played, width and height of the board
+    """
+    width, height, n_moves = RECORD_HEADER.unpack_from(record)
+    data: np.ndarray = np.frombuffer(record, dtype=np.uint8, offset=RECORD_HEADER.size)
+    if width <= 16:
+        data = np.stack((data >> 4, data & 0x0F), axis=1).ravel()
+    return data[:n_moves].tolist(), width, height
+
+
+def read_records(file: BinaryIO) -> Iterator[Tuple[List[int], int, int]]:
+    """Streams the binary records of a file one at a time
+
+    Args:
+        file (BinaryIO): file containing records created by pack_moves
+
+    Raises:
+        ValueError: if the file ends in the middle of a record
+
+    Yields:
+        Tuple[List[int], int, int]: the columns played, width and height of the board
+    """
+    while header := file.read(RECORD_HEADER.size):
+        if len(header) < RECORD_HEADER.size:
+            raise ValueError('Truncated game record')
+        width, _, n_moves = RECORD_HEADER.unpack(header)
+        n_bytes: int = (n_moves + 1) // 2 if width <= 16 else n_moves
+        body: bytes = file.read(n_bytes)
+        if len(body) < n_bytes:
+            raise ValueError('Truncated game record')
+        yield unpack_moves(header + body)
+
+
+def pack_board(board: Board) -> bytes:
+    """Packs a board state into bytes, using 2 bits per field
+
+    Args:
+        board (Board): the board to pack
+
+    Returns:
+        bytes: the width and height followed by the packed fields
+    """
+    state: np.ndarray = board.board_state.astype(np.uint8).ravel()
+    bits: np.ndarray = np.stack((state >> 1, state & 1), axis=1).ravel()
+    return bytes((board.width, board.height)) + np.packbits(bits).tobytes()
+
+
+def unpack_board(data: bytes) -> Board:
+    """Unpacks a board state created by pack_board
+
+    Args:
+        data (bytes): the packed board
+
+    Returns:
+        Board: a new board with the unpacked state
+    """
+    width, height = data[0], data[1]
+    bits: np.ndarray = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=2))[:2 * width * height]
+    state: np.ndarray = (bits[0::2].astype(int) << 1) | bits[1::2]
+    return Board(state.reshape(width, height))
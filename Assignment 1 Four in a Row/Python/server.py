@@ -0,0 +1,575 @@
+from heuristics import SimpleHeuristic
+from players import MinMaxPlayer, SearchTimeout
+from board import Board
+from app import winning
+from records import encode_moves
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count
+from typing import Dict, List, Tuple
+import numpy as np
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def search_move(state: np.ndarray, player_id: int, game_n: int, depth: int, budget: float) -> Tuple[int, int]:
+    """Searches the best move within a time budget, runs inside a worker process
+    Uses iterative deepening: the search depth is increased until the max depth is reached, or until the
+    next depth is not expected to finish within the budget. A search that passes the deadline anyway is
+    aborted, so the worker is free again shortly after the budget; only depth 1 always finishes
+
+    Args:
+        state (np.ndarray): the board state
+        player_id (int): the player to move
+        game_n (int): n in a row required to win
+        depth (int): the max search depth
+        budget (float): time budget in seconds
+
+    Returns:
+        Tuple[int, int]: the best move and the depth that was searched
+    """
+    deadline: float = time.perf_counter() + budget
+    board: Board = Board(state)
+    player: MinMaxPlayer = MinMaxPlayer(player_id, game_n, 1, SimpleHeuristic(game_n))
+
+    move: int = player.make_move(board)
+    player.deadline = deadline
+    for d in range(2, depth + 1):
+        start: float = time.perf_counter()
+        player.depth = d
+        try:
+            move = player.make_move(board) # the tree of the previous depth is kept
+        except SearchTimeout:
+            return move, d - 1
+        # every extra level multiplies the work by at most the number of columns
+        if time.perf_counter() + (time.perf_counter() - start) * board.width > deadline:
+            return move, d
+    return move, depth
+
+
+class ServiceBusyError(Exception):
+    """Raised when the service does not accept more games
+    """
+    pass
+
+
+class GameSession:
+    """A single game hosted by the game service
+    """
+    def __init__(self, game_id: str, game_n: int, width: int, height: int, ai_depths: Dict[int, int], budget: float) -> None:
+        """
+        Args:
+            game_id (str): id of the game
+            game_n (int): n in a row required to win
+            width (int): width of the board
+            height (int): height of the board
+            ai_depths (Dict[int, int]): search depth for every player controlled by the service
+            budget (float): time budget in seconds for every move of the service
+        """
+        self.game_id: str = game_id
+        self.game_n: int = game_n
+        self.board: Board = Board(width, height)
+        self.ai_depths: Dict[int, int] = ai_depths
+        self.budget: float = budget
+        self.moves: List[int] = []
+        self.current_player: int = 1
+        self.winner: int = 0
+        self.failure: str | None = None # reason the service could not continue the game
+        self.updated: asyncio.Event = asyncio.Event() # set after every move
+        self.last_active: float = time.perf_counter() # time of the last move or read by a client
+
+
+    def is_over(self) -> bool:
+        """
+        Returns:
+            bool: true if the game has a winner, is a draw or has failed
+        """
+        return self.winner != 0 or self.failure is not None
+
+
+    def is_ai_turn(self) -> bool:
+        """
+        Returns:
+            bool: true if the game is not over and the service has to make the next move
+        """
+        return not self.is_over() and self.current_player in self.ai_depths
+
+
+    def play(self, col: int) -> None:
+        """Lets the current player make a move
+
+        Args:
+            col (int): column of the action
+
+        Raises:
+            ValueError: if the game is over or the move is not valid
+        """
+        if self.is_over():
+            raise ValueError('The game is over')
+        if not 0 <= col < self.board.width or not self.board.play(col, self.current_player):
+            raise ValueError(f'Column {col} is not a valid move')
+
+        self.moves.append(col)
+        self.current_player = 3 - self.current_player
+        self.winner = winning(self.board.get_board_state(), self.game_n)
+        self._notify()
+
+
+    def fail(self, reason: str) -> None:
+        """Ends the game because the service could not make its move
+
+        Args:
+            reason (str): description of the error
+        """
+        self.failure = reason
+        self._notify()
+
+
+    def _notify(self) -> None:
+        """Wakes up everyone waiting for the next update of the game
+        """
+        self.last_active = time.perf_counter()
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+    def to_dict(self) -> Dict:
+        """
+        Returns:
+            Dict: the state of the game
+        """
+        return {
+            'game': self.game_id,
+            'moves': encode_moves(self.moves),
+            'board': self.board.get_board_state().tolist(),
+            'to_move': self.current_player,
+            'winner': self.winner,
+            'failed': self.failure
+        }
+
+
+class ServiceMetrics:
+    """Queueing and latency measurements of the game service
+    """
+    def __init__(self) -> None:
+        """Starts without any measurements
+        """
+        self.queue_waits: List[float] = [] # seconds between a game needing a move and a worker picking it up
+        self.search_times: List[float] = [] # seconds spent waiting for a worker process
+        self.searched_depths: List[int] = []
+        self.timeouts: int = 0
+        self.games_started: int = 0
+        self.games_finished: int = 0
+        self.games_failed: int = 0
+        self.games_expired: int = 0
+        self.games_rejected: int = 0
+
+
+    def to_dict(self, queue_length: int, active_games: int) -> Dict:
+        """
+        Args:
+            queue_length (int): number of games waiting for a worker
+            active_games (int): number of games that are not finished
+
+        Returns:
+            Dict: summary of the measurements, latencies in milliseconds
+        """
+        return {
+            'queue_length': queue_length,
+            'active_games': active_games,
+            'games_started': self.games_started,
+            'games_finished': self.games_finished,
+            'games_failed': self.games_failed,
+            'games_expired': self.games_expired,
+            'games_rejected': self.games_rejected,
+            'moves_searched': len(self.search_times),
+            'timeouts': self.timeouts,
+            'average_depth': sum(self.searched_depths) / len(self.searched_depths) if self.searched_depths else 0,
+            'queue_wait_ms': self._percentiles(self.queue_waits),
+            'search_ms': self._percentiles(self.search_times)
+        }
+
+
+    @staticmethod
+    def _percentiles(values: List[float]) -> Dict[str, float]:
+        """
+        Args:
+            values (List[float]): measurements in seconds
+
+        Returns:
+            Dict[str, float]: the 50th, 95th and 99th percentile and the max in milliseconds
+        """
+        if not values:
+            return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        p50, p95, p99, p100 = 1000 * np.percentile(values, [50, 95, 99, 100])
+        return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(p100)}
+
+
+class GameService:
+    """Hosts many games at once and computes the moves of the service in a pool of worker processes
+    Games needing a move wait in a single FIFO queue and a game is only queued again after its move
+    has been made, so every game gets its turn before any game gets a second one.
+    A game is removed from the service once it is over and its final state has been sent to a client,
+    or when no move was made and no client asked for it for longer than the session TTL.
+    """
+    MAX_BUDGET: float = 60.0 # max time budget in seconds per move
+
+    def __init__(self, workers: int, max_games: int, session_ttl: float = 600.0) -> None:
+        """
+        Args:
+            workers (int): number of worker processes, at most this many searches run at once
+            max_games (int): max number of unfinished games, new games are refused above this limit
+            session_ttl (float): seconds after which an idle or finished game that nobody reads is removed
+        """
+        self.workers: int = workers
+        self.max_games: int = max_games
+        self.session_ttl: float = session_ttl
+        self.sessions: Dict[str, GameSession] = {}
+        self.metrics: ServiceMetrics = ServiceMetrics()
+        self._ids = count(1)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_games) # (game id, time queued)
+        self._executor: ProcessPoolExecutor | None = None
+        self._dispatchers: List[asyncio.Task] = []
+        self._reaper: asyncio.Task | None = None
+
+
+    async def start(self) -> None:
+        """Starts the worker processes, the tasks handing out work to them and the task removing expired games
+        """
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self._reaper = asyncio.create_task(self._reap())
+
+
+    async def stop(self) -> None:
+        """Stops handing out work and shuts down the worker processes
+        """
+        tasks: List[asyncio.Task] = self._dispatchers + [self._reaper]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(cancel_futures=True)
+
+
+    def active_games(self) -> int:
+        """
+        Returns:
+            int: number of games that are not finished
+        """
+        return sum(1 for session in self.sessions.values() if not session.is_over())
+
+
+    def new_game(self, ai_depths: Dict[int, int], game_n: int = 4, width: int = 7, height: int = 6, budget: float = 1.0) -> GameSession:
+        """Creates a new game
+
+        Args:
+            ai_depths (Dict[int, int]): search depth for every player controlled by the service
+            game_n (int): n in a row required to win
+            width (int): width of the board
+            height (int): height of the board
+            budget (float): time budget in seconds for every move of the service, at most MAX_BUDGET
+
+        Raises:
+            ServiceBusyError: if the max number of unfinished games is reached
+            ValueError: if the game settings are not possible or not numbers
+
+        Returns:
+            GameSession: the new game
+        """
+        if self.active_games() >= self.max_games:
+            self.metrics.games_rejected += 1
+            raise ServiceBusyError(f'The service is hosting the max of {self.max_games} games')
+        try:
+            valid: bool = 1 < game_n <= min(width, height) and set(ai_depths) <= {1, 2} and 0 < budget <= self.MAX_BUDGET
+        except TypeError:
+            valid = False
+        if not valid:
+            raise ValueError('Invalid game settings')
+
+        session: GameSession = GameSession(str(next(self._ids)), game_n, width, height, ai_depths, budget)
+        self.sessions[session.game_id] = session
+        self.metrics.games_started += 1
+        self._schedule(session)
+        return session
+
+
+    def play(self, game_id: str, col: int) -> GameSession:
+        """Makes a move for a player that is not controlled by the service
+
+        Args:
+            game_id (str): id of the game
+            col (int): column of the action
+
+        Raises:
+            KeyError: if the game does not exist
+            ValueError: if it is not the turn of a human player or the move is not valid
+
+        Returns:
+            GameSession: the game
+        """
+        session: GameSession = self.sessions[game_id]
+        if session.is_ai_turn() or session.is_over():
+            raise ValueError('It is not your turn')
+        session.play(col)
+        self._finish_or_schedule(session)
+        return session
+
+
+    def _schedule(self, session: GameSession) -> None:
+        """Queues a game if the service has to make the next move
+
+        Args:
+            session (GameSession): the game
+        """
+        if session.is_ai_turn():
+            # never blocks, a game is in the queue at most once and the number of games is bounded
+            self._queue.put_nowait((session.game_id, time.perf_counter()))
+
+
+    def _finish_or_schedule(self, session: GameSession) -> None:
+        """
+        Args:
+            session (GameSession): a game in which a move was just made
+        """
+        if session.is_over():
+            self.metrics.games_finished += 1
+        else:
+            self._schedule(session)
+
+
+    async def _dispatch(self) -> None:
+        """Takes games from the queue and has a worker process compute their next move
+        A game whose move fails is marked as failed, the dispatcher goes on with the next game
+        """
+        while True:
+            game_id, queued = await self._queue.get()
+            try:
+                await self._make_move(self.sessions[game_id], queued)
+            except Exception as e:
+                logger.exception('Move in game %s failed', game_id)
+                self.metrics.games_failed += 1
+                if game_id in self.sessions:
+                    self.sessions[game_id].fail(f'The service could not make its move: {e!r}')
+            finally:
+                self._queue.task_done()
+
+
+    async def _make_move(self, session: GameSession, queued: float) -> None:
+        """Has a worker process search the next move of a game and plays it
+        The worker stops searching at the time budget, if it does not answer within twice the budget the
+        move of the heuristic is played instead. The worker is only handed new work after its search has
+        ended, so the pool never runs more searches than there are workers.
+
+        Args:
+            session (GameSession): a game in which the service has to move
+            queued (float): time at which the game was queued
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        executor: ProcessPoolExecutor = self._executor
+        self.metrics.queue_waits.append(time.perf_counter() - queued)
+
+        start: float = time.perf_counter()
+        try:
+            search: asyncio.Future = loop.run_in_executor(
+                executor, search_move, session.board.get_board_state(), session.current_player,
+                session.game_n, session.ai_depths[session.current_player], session.budget
+            )
+        except BrokenProcessPool:
+            self._restart_pool(executor)
+            raise
+        try:
+            try:
+                move, depth = await asyncio.wait_for(asyncio.shield(search), timeout=2 * session.budget)
+            except asyncio.TimeoutError:
+                # the worker missed the deadline, fall back to the heuristic
+                self.metrics.timeouts += 1
+                move, depth = SimpleHeuristic(session.game_n).get_best_action(session.current_player, session.board), 1
+            except BrokenProcessPool:
+                self._restart_pool(executor)
+                raise
+            self.metrics.search_times.append(time.perf_counter() - start)
+            self.metrics.searched_depths.append(depth)
+
+            session.play(int(move))
+            self._finish_or_schedule(session)
+        finally:
+            await asyncio.wait([search])
+
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Replaces a pool of worker processes that broke, e.g. because a worker was killed
+
+        Args:
+            broken (ProcessPoolExecutor): the broken pool, nothing happens if it was already replaced
+        """
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+
+    def remove_expired(self) -> int:
+        """Removes the games in which no move was made and that no client asked for within the session TTL
+        A game waiting for a move of the service is never idle, it is in the queue.
+
+        Returns:
+            int: number of removed games
+        """
+        oldest: float = time.perf_counter() - self.session_ttl
+        expired: List[str] = [game_id for game_id, session in self.sessions.items()
+                              if session.last_active < oldest and not session.is_ai_turn()]
+        for game_id in expired:
+            del self.sessions[game_id]
+        self.metrics.games_expired += len(expired)
+        return len(expired)
+
+
+    async def _reap(self) -> None:
+        """Removes expired games a few times per session TTL
+        """
+        while True:
+            await asyncio.sleep(max(self.session_ttl / 4, 1.0))
+            self.remove_expired()
+
+
+    def _result(self, session: GameSession) -> Dict:
+        """The state of a game for a client, a game that is over is removed since its result has been read
+
+        Args:
+            session (GameSession): the game
+
+        Returns:
+            Dict: the state of the game
+        """
+        session.last_active = time.perf_counter()
+        if session.is_over():
+            self.sessions.pop(session.game_id, None)
+        return session.to_dict()
+
+
+    async def handle_request(self, request: Dict) -> Dict:
+        """Handles a single request of a client
+
+        Commands:
+            new: starts a game, optional fields ai (player id -> depth), game_n, width, height and budget
+            move: plays column 'column' in game 'game'
+            state: returns game 'game', waits for the next move if 'wait' is true
+        A game that is over can be requested once more, after that it is removed
+            metrics: returns the queueing and latency measurements
+
+        Args:
+            request (Dict): the request
+
+        Returns:
+            Dict: the response, containing the field 'error' if the request failed
+        """
+        try:
+            command: str = request.get('command')
+            if command == 'new':
+                ai_depths: Dict[int, int] = {int(k): int(v) for k, v in request.get('ai', {'2': 4}).items()}
+                session: GameSession = self.new_game(ai_depths, request.get('game_n', 4), request.get('width', 7),
+                                                     request.get('height', 6), request.get('budget', 1.0))
+                return session.to_dict()
+            if command == 'move':
+                return self._result(self.play(str(request['game']), int(request['column'])))
+            if command == 'state':
+                session = self.sessions[str(request['game'])]
+                if request.get('wait') and not session.is_over():
+                    await session.updated.wait()
+                return self._result(session)
+            if command == 'metrics':
+                return self.metrics.to_dict(self._queue.qsize(), self.active_games())
+            return {'error': f'Unknown command {command!r}'}
+        except ServiceBusyError as e:
+            return {'error': str(e), 'busy': True}
+        except KeyError as e:
+            return {'error': f'Unknown game or missing field {e}'}
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves a client connection, one JSON request per line and one JSON response per line
+
+        Args:
+            reader (asyncio.StreamReader): the incoming stream
+            writer (asyncio.StreamWriter): the outgoing stream
+        """
+        try:
+            while line := await reader.readline():
+                try:
+                    response: Dict = await self.handle_request(json.loads(line))
+                except json.JSONDecodeError:
+                    response = {'error': 'Invalid JSON'}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, workers: int, max_games: int, session_ttl: float) -> None:
+    """Runs the game service on a local socket until interrupted
+
+    Args:
+        host (str): address to listen on
+        port (int): port to listen on
+        workers (int): number of worker processes
+        max_games (int): max number of unfinished games
+        session_ttl (float): seconds after which an idle or finished game that nobody reads is removed
+    """
+    service: GameService = GameService(workers, max_games, session_ttl)
+    await service.start()
+    server: asyncio.Server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f'Serving on {host}:{port}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+async def self_play(games: int, workers: int, depth: int, budget: float) -> Dict:
+    """Hosts many games between two service players at once and measures the service
+
+    Args:
+        games (int): number of games to play at the same time
+        workers (int): number of worker processes
+        depth (int): search depth of both players
+        budget (float): time budget in seconds for every move
+
+    Returns:
+        Dict: the measurements of the service
+    """
+    service: GameService = GameService(workers, games)
+    await service.start()
+    try:
+        sessions: List[GameSession] = [service.new_game({1: depth, 2: depth}, budget=budget) for _ in range(games)]
+        for session in sessions:
+            while not session.is_over():
+                await session.updated.wait()
+        return service.metrics.to_dict(0, 0)
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host n in a row games against the minmax player')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=2, help='number of worker processes')
+    parser.add_argument('--max-games', type=int, default=64, help='max number of unfinished games')
+    parser.add_argument('--session-ttl', type=float, default=600.0, help='seconds after which an idle or unread finished game is removed')
+    parser.add_argument('--self-play', type=int, default=0, help='play this many games between two service players and print the metrics')
+    parser.add_argument('--depth', type=int, default=4, help='search depth for self-play')
+    parser.add_argument('--budget', type=float, default=1.0, help='time budget in seconds per move for self-play')
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.self_play:
+        print(json.dumps(asyncio.run(self_play(args.self_play, args.workers, args.depth, args.budget)), indent=2))
+    else:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_games, args.session_ttl))
@@ -0,0 +1,156 @@
+from __future__ import annotations
+import numpy as np
+from typing import List, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from board import Board
+
+
+def to_bitboards(board: Board, player_id: int) -> Tuple[int, int, int]:
+    """Converts a board to bitboards
+    Every column uses height + 1 bits, bit 0 being the bottom field. The extra bit on top
+    of each column is always empty, which stops rows of fields from wrapping to the next column.
+
+    Args:
+        board (Board): the board to convert
+        player_id (int): the player whose fields are stored in the first bitboard
+
+    Returns:
+        Tuple[int, int, int]: fields of the player, fields of the opponent, all fields on the board
+    """
+    state: np.ndarray = board.board_state
+    padded: np.ndarray = np.zeros((board.width, board.height + 1), dtype=np.int8)
+    padded[:, :board.height] = state[:, ::-1]
+    board_mask: int = ((1 << (board.width * (board.height + 1))) - 1) & ~_top_mask(board)
+    return _pack(padded == player_id), _pack((padded != 0) & (padded != player_id)), board_mask
+
+
+def winning_cells(position: int, board_mask: int, height: int, game_n: int) -> int:
+    """Finds all fields that would complete n in a row for a player
+
+    Args:
+        position (int): bitboard of the fields of the player
+        board_mask (int): bitboard of all fields on the board
+        height (int): height of the board
+        game_n (int): n in a row required to win
+
+    Returns:
+        int: bitboard of the fields that would win the game, occupied fields included
+    """
+    cells: int = 0
+    for shift in (1, height, height + 1, height + 2): # vertical, diagonal, horizontal, diagonal
+        for gap in range(game_n):
+            run: int = board_mask
+            for k in range(game_n):
+                if k != gap:
+                    offset: int = (k - gap) * shift
+                    run &= position >> offset if offset > 0 else position << -offset
+            cells |= run
+    return cells & board_mask
+
+
+class ThreatAnalysis:
+    """Classification of the moves of a player based on immediate threats
+    """
+    def __init__(self, board: Board, player_id: int, game_n: int) -> None:
+        """Classifies every valid move of the player
+
+        Args:
+            board (Board): the board to analyse
+            player_id (int): the player that is about to move
+            game_n (int): n in a row required to win
+        """
+        position: int
+        opponent: int
+        board_mask: int
+        position, opponent, board_mask = to_bitboards(board, player_id)
+        h1: int = board.height + 1
+        filled: int = position | opponent
+        bottom: int = sum(1 << (col * h1) for col in range(board.width))
+        playable: int = (filled + bottom) & board_mask
+
+        own_wins: int = winning_cells(position, board_mask, board.height, game_n) & ~filled
+        other_wins: int = winning_cells(opponent, board_mask, board.height, game_n) & ~filled
+
+        self.valid: List[int] = _columns(playable, board.width, h1)
+        self.winning: List[int] = _columns(playable & own_wins, board.width, h1) # win right away
+        self.forced: List[int] = _columns(playable & other_wins, board.width, h1) # opponent wins here next
+        self.losing: List[int] = _columns(playable & (other_wins >> 1), board.width, h1) # opponent wins on top of it
+
+
+    def non_losing_moves(self) -> List[int]:
+        """Gets the moves that do not hand the opponent a win on their next move
+
+        Returns:
+            List[int]: the winning moves if there are any, otherwise the moves that do not lose right away.
+                       If every move loses, all valid moves are returned
+        """
+        if self.winning:
+            return self.winning
+        if self.forced:
+            return self.forced[:1] # with more than one threat the game is lost anyway
+        moves: List[int] = [col for col in self.valid if col not in self.losing]
+        return moves if moves else self.valid
+
+
+def analyse_threats(board: Board, player_id: int, game_n: int) -> ThreatAnalysis:
+    """
+    Args:
+        board (Board): the board to analyse
+        player_id (int): the player that is about to move
+        game_n (int): n in a row required to win
+
+    Returns:
+        ThreatAnalysis: the classification of the moves of the player
+    """
+    return ThreatAnalysis(board, player_id, game_n)
+
+
+def non_losing_moves(board: Board, player_id: int, game_n: int) -> List[int]:
+    """Gets the moves worth searching for the player that is about to move
+
+    Args:
+        board (Board): the board to analyse
+        player_id (int): the player that is about to move
+        game_n (int): n in a row required to win
+
+    Returns:
+        List[int]: see ThreatAnalysis.non_losing_moves
+    """
+    return ThreatAnalysis(board, player_id, game_n).non_losing_moves()
+
+
+def _pack(bits: np.ndarray) -> int:
+    """
+    Args:
+        bits (np.ndarray): boolean array, flattened column by column
+
+    Returns:
+        int: the array as an integer, the first element being the least significant bit
+    """
+    return int.from_bytes(np.packbits(bits.ravel(), bitorder='little').tobytes(), 'little')
+
+
+def _top_mask(board: Board) -> int:
+    """
+    Args:
+        board (Board): the board
+
+    Returns:
+        int: bitboard of the always empty extra bit on top of each column
+    """
+    h1: int = board.height + 1
+    return sum(1 << (col * h1 + board.height) for col in range(board.width))
+
+
+def _columns(cells: int, width: int, h1: int) -> List[int]:
+    """
+    Args:
+        cells (int): bitboard of fields
+        width (int): width of the board
+        h1 (int): number of bits per column
+
+    Returns:
+        List[int]: the columns containing at least one of the fields
+    """
+    column_mask: int = (1 << h1) - 1
+    return [col for col in range(width) if (cells >> (col * h1)) & column_mask]
@@ -0,0 +1,115 @@
+from heuristics import PatternHeuristic
+from players import MinMaxPlayer
+from board import Board
+from app import winning
+from typing import List, Tuple
+import numpy as np
+import argparse
+import json
+
+
+def self_play(heuristic: PatternHeuristic, games: int, width: int, height: int, depth: int,
+              epsilon: float, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """Plays games between two minmax players and records every position with the final result
+
+    Args:
+        heuristic (PatternHeuristic): heuristic whose weights both players use
+        games (int): number of games to play
+        width (int): width of the board
+        height (int): height of the board
+        depth (int): search depth of both players
+        epsilon (float): chance of a random move, which makes the games differ from each other
+        rng (np.random.Generator): random number generator
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the board states that are not finished, and for each the result
+                                       for player 1: 1 for a win, 0.5 for a draw, 0 for a loss
+    """
+    states: List[np.ndarray] = []
+    results: List[float] = []
+
+    for _ in range(games):
+        players: List[MinMaxPlayer] = [
+            MinMaxPlayer(1, heuristic.game_n, depth, PatternHeuristic(heuristic.game_n, heuristic.weights)),
+            MinMaxPlayer(2, heuristic.game_n, depth, PatternHeuristic(heuristic.game_n, heuristic.weights))
+        ]
+        board: Board = Board(width, height)
+        game_states: List[np.ndarray] = []
+        current_player_index: int = 0
+        winner: int = 0
+
+        while winner == 0:
+            player: MinMaxPlayer = players[current_player_index]
+            if rng.random() < epsilon:
+                move: int = int(rng.choice([col for col in range(width) if board.is_valid(col)]))
+            else:
+                move = player.make_move(board)
+            board.play(move, player.player_id)
+            winner = winning(board.get_board_state(), heuristic.game_n)
+            if winner == 0:
+                game_states.append(board.get_board_state())
+            current_player_index = 1 - current_player_index
+
+        states.extend(game_states)
+        results.extend([0.5 if winner < 0 else float(winner == 1)] * len(game_states))
+
+    return np.array(states), np.array(results)
+
+
+def fit_weights(features: np.ndarray, results: np.ndarray, iterations: int, l2: float) -> np.ndarray:
+    """Fits a logistic regression predicting the result from the features, using gradient descent
+
+    Args:
+        features (np.ndarray): features with shape (positions, features)
+        results (np.ndarray): result for every position, between 0 and 1
+        iterations (int): number of gradient descent steps
+        l2 (float): strength of the L2 regularisation
+
+    Returns:
+        np.ndarray: one weight per feature, in logits
+    """
+    scale: np.ndarray = features.std(axis=0)
+    scale[scale == 0] = 1
+    x: np.ndarray = features / scale
+    weights: np.ndarray = np.zeros(x.shape[1])
+
+    for _ in range(iterations):
+        predictions: np.ndarray = 1 / (1 + np.exp(-(x @ weights)))
+        gradient: np.ndarray = x.T @ (predictions - results) / len(results) + l2 * weights
+        weights -= 0.5 * gradient
+
+    return weights / scale
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tune the weights of the pattern heuristic with self-play')
+    parser.add_argument('-o', '--output', default='pattern_weights.json', help='where to write the weights')
+    parser.add_argument('--games', type=int, default=200, help='number of self-play games')
+    parser.add_argument('--rounds', type=int, default=2, help='times to play and refit with the new weights')
+    parser.add_argument('--depth', type=int, default=2, help='search depth of the self-play players')
+    parser.add_argument('--epsilon', type=float, default=0.15, help='chance of a random move')
+    parser.add_argument('--game-n', type=int, default=4, help='n in a row required to win')
+    parser.add_argument('--width', type=int, default=7, help='width of the board')
+    parser.add_argument('--height', type=int, default=6, help='height of the board')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random number generator')
+    args: argparse.Namespace = parser.parse_args()
+
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    heuristic: PatternHeuristic = PatternHeuristic(args.game_n)
+
+    for i in range(args.rounds):
+        states, results = self_play(heuristic, args.games, args.width, args.height, args.depth, args.epsilon, rng)
+        features: np.ndarray = heuristic.features(1, states)
+        logits: np.ndarray = fit_weights(features, results, iterations=2000, l2=1e-3)
+
+        predictions: np.ndarray = 1 / (1 + np.exp(-(features @ logits)))
+        decided: np.ndarray = results != 0.5
+        accuracy: float = np.mean((predictions[decided] > 0.5) == (results[decided] == 1)) if decided.any() else 0
+        print(f'Round {i + 1}: {len(states)} positions, accuracy on decided games {accuracy:.1%}')
+
+        # utilities are hundredths of a logit, so the integer utilities keep enough precision
+        heuristic = PatternHeuristic(args.game_n, 100 * logits)
+
+    print('Weights:', np.round(heuristic.weights, 2).tolist())
+    with open(args.output, 'w') as file:
+        json.dump({'game_n': args.game_n, 'weights': heuristic.weights.tolist()}, file, indent=2)
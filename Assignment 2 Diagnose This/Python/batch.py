@@ -0,0 +1,263 @@
+from conflictsets import ConflictSetRetriever
+from hittingsets import run_hitting_set_algorithm
+from heuristics import shortest_conflict_set_heuristic
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from time import perf_counter
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+import argparse
+import json
+import os
+import random
+import sys
+
+
+# Retriever of the worker process, the circuit is read and encoded once per worker
+_retriever: Optional[ConflictSetRetriever] = None
+
+
+def _init_worker(document_path: str, backend: str):
+    """
+    Initializer of a worker process: reads the circuit and encodes it in the solver.
+
+    :param document_path: path to the circuit file.
+    :param backend: consistency backend of the retriever.
+    """
+    global _retriever
+    _retriever = ConflictSetRetriever(document_path, backend)
+
+
+def diagnose(csr: ConflictSetRetriever, observations: Dict[str, bool], engine: str,
+             heuristic: Callable) -> Dict:
+    """
+    Diagnoses the circuit of a retriever for one observation vector.
+
+    :param csr: retriever with the encoded circuit.
+    :param observations: observed value of observation names, see Circuit.with_observations.
+    :param engine: conflict set engine.
+    :param heuristic: heuristic of the hitting set algorithm.
+    :return: record with the observations, conflict sets and diagnoses (minimal hitting sets).
+    """
+    csr.set_observations(observations)
+    conflict_sets = csr.retrieve_conflict_sets(engine)
+    _, diagnoses = run_hitting_set_algorithm(conflict_sets, heuristic)
+    return {"observations": observations, "conflict_sets": conflict_sets, "diagnoses": diagnoses}
+
+
+def diagnose_chunk(chunk: List[Dict[str, bool]], engine: str, heuristic: Callable) -> Tuple[List[Dict], int, float]:
+    """
+    Diagnoses a chunk of observation vectors, runs inside a worker process.
+
+    :param chunk: observation vectors.
+    :param engine: conflict set engine.
+    :param heuristic: heuristic of the hitting set algorithm.
+    :return: a record for every observation vector, and the consistency checks and solver time they took.
+    """
+    calls, seconds = _retriever.solver_calls, _retriever.solver_time
+    records = [diagnose(_retriever, observations, engine, heuristic) for observations in chunk]
+    return records, _retriever.solver_calls - calls, _retriever.solver_time - seconds
+
+
+class BatchMetrics:
+    """
+    Throughput of a batch diagnosis, updated while the records are streamed.
+    """
+    def __init__(self):
+        self.start = perf_counter()
+        self.records = 0
+        self.solver_calls = 0
+        self.solver_time = 0.0  # summed over all workers
+
+
+    def add(self, records: int, solver_calls: int, solver_time: float):
+        """
+        :param records: number of records of a finished chunk.
+        :param solver_calls: consistency checks of the chunk.
+        :param solver_time: solver time of the chunk.
+        """
+        self.records += records
+        self.solver_calls += solver_calls
+        self.solver_time += solver_time
+
+
+    def elapsed(self) -> float:
+        """
+        :return: wall-clock seconds since the batch started.
+        """
+        return perf_counter() - self.start
+
+
+    def records_per_second(self) -> float:
+        """
+        :return: diagnosed observation vectors per wall-clock second.
+        """
+        elapsed = self.elapsed()
+        return self.records / elapsed if elapsed else 0.0
+
+
+    def summary(self) -> str:
+        """
+        :return: the metrics as a single line.
+        """
+        return (f"{self.records:,} observation vectors in {self.elapsed():,.2f} s "
+                f"({self.records_per_second():,.1f}/s), {self.solver_calls:,} consistency checks "
+                f"({self.solver_time:,.2f} s solver time)")
+
+
+def diagnose_batch(document_path: str, observation_vectors: Iterable[Dict[str, bool]], engine: str = "lattice",
+                   backend: str = "z3", heuristic: Callable = shortest_conflict_set_heuristic,
+                   workers: Optional[int] = None, chunk_size: int = 16, max_in_flight: Optional[int] = None,
+                   metrics: Optional[BatchMetrics] = None) -> Iterator[Dict]:
+    """
+    Diagnoses many observation vectors against one circuit on a pool of worker processes.
+    Every worker reads and encodes the circuit once and then only swaps the observations.
+    Records are yielded in input order as soon as their chunk is done; at most max_in_flight chunks
+    are submitted at once, so the input is never read far ahead of the output.
+
+    :param document_path: path to the circuit file.
+    :param observation_vectors: observed values, each a dict of observation names, see Circuit.with_observations.
+                                Observations a vector does not give keep their value from the circuit file.
+    :param engine: conflict set engine.
+    :param backend: consistency backend.
+    :param heuristic: heuristic of the hitting set algorithm.
+    :param workers: number of worker processes, the number of cores by default.
+    :param chunk_size: observation vectors per task.
+    :param max_in_flight: max tasks waiting for a result, twice the workers by default.
+    :param metrics: optional metrics that are updated while streaming.
+    :return: generator of records with the observations, conflict sets and diagnoses.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    metrics = metrics if metrics is not None else BatchMetrics()
+    vectors = iter(observation_vectors)
+    in_flight: Deque[Future] = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(document_path, backend)) as executor:
+        while chunk := list(islice(vectors, chunk_size)):
+            if len(in_flight) >= max_in_flight:
+                yield from _finish(in_flight.popleft(), metrics)
+            in_flight.append(executor.submit(diagnose_chunk, chunk, engine, heuristic))
+
+        while in_flight:
+            yield from _finish(in_flight.popleft(), metrics)
+
+
+def _finish(future: Future, metrics: BatchMetrics) -> List[Dict]:
+    """
+    :param future: a submitted chunk.
+    :param metrics: metrics to update.
+    :return: the records of the chunk.
+    """
+    records, solver_calls, solver_time = future.result()
+    metrics.add(len(records), solver_calls, solver_time)
+    return records
+
+
+def check_records(document_path: str, records: List[Dict], engine: str, backend: str = "z3",
+                  heuristic: Callable = shortest_conflict_set_heuristic) -> List[int]:
+    """
+    Diagnoses the observation vectors of records again on a single retriever, in reverse order,
+    so every vector runs after other vectors than in the batch. The diagnoses must not change.
+
+    :param document_path: path to the circuit file.
+    :param records: records of diagnose_batch.
+    :param engine: conflict set engine.
+    :param backend: consistency backend.
+    :param heuristic: heuristic of the hitting set algorithm.
+    :return: positions of the records whose diagnoses differ.
+    """
+    csr = ConflictSetRetriever(document_path, backend)
+    return [i for i in reversed(range(len(records)))
+            if diagnose(csr, records[i]["observations"], engine, heuristic)["diagnoses"] != records[i]["diagnoses"]]
+
+
+def read_observations(path: str) -> Iterator[Dict[str, bool]]:
+    """
+    Streams observation vectors from a file with one JSON object per line, e.g. {"IN1(X1)": 1, "OUT(X2)": 0}.
+
+    :param path: the file, - for standard input.
+    :return: generator of observation vectors.
+    """
+    file = sys.stdin if path == "-" else open(path, "r")
+    try:
+        for line in file:
+            if line.strip():
+                yield {name: bool(value) for name, value in json.loads(line).items()}
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def random_observations(document_path: str, count: int, seed: int) -> Iterator[Dict[str, bool]]:
+    """
+    Generates random values for the observed points of a circuit.
+
+    :param document_path: path to the circuit file.
+    :param count: number of observation vectors.
+    :param seed: seed of the random number generator.
+    :return: generator of observation vectors.
+    """
+    rng = random.Random(seed)
+    names = ConflictSetRetriever(document_path).circuit.observation_names()
+    for _ in range(count):
+        yield {name: rng.random() < 0.5 for name in names}
+
+
+def parse_arguments(argv: List[str]) -> argparse.Namespace:
+    """
+    :param argv: command line arguments.
+    :return: the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Diagnose one circuit for many observation vectors")
+    parser.add_argument("circuit", help="circuit file with the gates and wiring")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--observations", help="file with one JSON object of observations per line, - for stdin")
+    source.add_argument("--random", type=int, help="diagnose this many random observation vectors")
+    parser.add_argument("-o", "--output", help="output file for the JSON records, standard output if not given")
+    parser.add_argument("--engine", choices=("powerset", "marco", "lattice"), default="lattice")
+    parser.add_argument("--backend", choices=ConflictSetRetriever.BACKENDS, default="z3")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=16, help="observation vectors per task")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --random")
+    parser.add_argument("--check", action="store_true",
+                        help="diagnose every vector again in reverse order and fail if a result changes")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]):
+    """
+    Entry point of the command line interface.
+
+    :param argv: command line arguments.
+    """
+    args = parse_arguments(argv)
+    if args.random is not None:
+        vectors = random_observations(args.circuit, args.random, args.seed)
+    else:
+        vectors = read_observations(args.observations)
+
+    metrics = BatchMetrics()
+    records = []  # only kept for --check
+    output: TextIO = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for record in diagnose_batch(args.circuit, vectors, args.engine, args.backend,
+                                     workers=args.workers, chunk_size=args.chunk_size, metrics=metrics):
+            output.write(json.dumps(record) + "\n")
+            if args.check:
+                records.append(record)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(metrics.summary(), file=sys.stderr)
+    if args.check:
+        differing = check_records(args.circuit, records, args.engine, args.backend)
+        print(f"Check: {len(differing)} of {len(records)} diagnoses depend on the order of the vectors", file=sys.stderr)
+        if differing:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,237 @@
+# Bitset representation of sets of components.
+# Every component is interned to a bit position, so a set of components is a single int and
+# subset tests, hits and unions are single bitwise operations. Python ints have arbitrary
+# precision, so circuits with more than 64 components need no special handling.
+
+def is_subset(mask: int, other: int) -> bool:
+    """
+    Checks whether a set is a subset of another set.
+
+    Args:
+        mask (int): the set that might be a subset.
+        other (int): the set that might contain it.
+
+    Returns:
+        bool: True if every bit of mask is also set in other.
+    """
+    return mask & other == mask
+
+
+def bit_positions(mask: int) -> list[int]:
+    """
+    Lists the bits that are set, lowest first.
+
+    Args:
+        mask (int): the set.
+
+    Returns:
+        list[int]: the positions of the set bits.
+    """
+    positions = []
+    while mask:
+        lowest = mask & -mask
+        positions.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return positions
+
+
+def nth_bit(mask: int, n: int) -> int:
+    """
+    Finds the position of the n-th set bit, with a binary search over the bit counts of prefixes,
+    so large sets are not scanned bit by bit.
+
+    Args:
+        mask (int): the set.
+        n (int): which set bit, 0 for the lowest.
+
+    Returns:
+        int: the position of the bit, or -1 if fewer than n + 1 bits are set.
+    """
+    if n < 0 or mask.bit_count() <= n:
+        return -1
+    low, high = 0, mask.bit_length() - 1
+    while low < high:
+        middle = (low + high) // 2
+        if (mask & ((2 << middle) - 1)).bit_count() > n:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class ComponentIndex:
+    """Interns component names to bit positions, in order of first appearance."""
+
+    def __init__(self, components=()):
+        self.components: list = []
+        self.positions: dict[any, int] = {}
+        for component in components:
+            self.bit(component)
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def bit(self, component: any) -> int:
+        """Get the bit of a component, interning it if it is new.
+
+        Args:
+            component (any): the component, e.g. 'X1'.
+
+        Returns:
+            int: the int with only the bit of the component set.
+        """
+        if component not in self.positions:
+            self.positions[component] = len(self.components)
+            self.components.append(component)
+        return 1 << self.positions[component]
+
+    def to_mask(self, components) -> int:
+        """Convert a set of components to a bitset.
+
+        Args:
+            components (iterable): the components.
+
+        Returns:
+            int: the bitset.
+        """
+        mask = 0
+        for component in components:
+            mask |= self.bit(component)
+        return mask
+
+    def to_components(self, mask: int) -> list:
+        """Convert a bitset back to a list of components, in interning order.
+
+        Args:
+            mask (int): the bitset.
+
+        Returns:
+            list: the components.
+        """
+        return [self.components[position] for position in bit_positions(mask)]
+
+
+class ConflictTable:
+    """
+    The conflict sets of a diagnosis problem, shared by all nodes of a hitting set DAG.
+    A node keeps the conflict sets it still has to hit as a bitset over the indices of this table,
+    so removing the conflict sets hit by a component is a single bitwise operation as well.
+    """
+
+    def __init__(self, conflict_sets: list[list]):
+        self.conflict_sets: list[list] = conflict_sets
+        self.components: ComponentIndex = ComponentIndex()
+        self.masks: list[int] = [self.components.to_mask(cs) for cs in conflict_sets]
+
+        # For every component the bitset of the conflict sets that contain it
+        self.hits: dict[any, int] = {component: 0 for component in self.components.components}
+        for i, cs in enumerate(conflict_sets):
+            for component in cs:
+                self.hits[component] |= 1 << i
+        # The same, indexed by the bit position of the component
+        self.component_hits: list[int] = list(self.hits.values())
+
+    def all_conflicts(self) -> int:
+        """
+        Returns:
+            int: the bitset of all conflict sets in the table.
+        """
+        return (1 << len(self.conflict_sets)) - 1
+
+    def unhit(self, remaining: int, component: any) -> int:
+        """Remove the conflict sets that contain a component.
+
+        Args:
+            remaining (int): bitset of conflict sets.
+            component (any): the component.
+
+        Returns:
+            int: bitset of the conflict sets in remaining that do not contain the component.
+        """
+        return remaining & ~self.hits.get(component, 0)
+
+    def select(self, remaining: int) -> list[list]:
+        """Convert a bitset of conflict sets back to the conflict sets themselves.
+
+        Args:
+            remaining (int): bitset of conflict sets.
+
+        Returns:
+            list[list]: the conflict sets, in table order.
+        """
+        return [self.conflict_sets[i] for i in bit_positions(remaining)]
+
+
+class SubsetIndex:
+    """
+    Set-trie of bitsets that answers whether any stored set is a subset of a query set.
+    Every stored set is a path of its bit positions in increasing order. A query only descends into
+    children whose bit is in the query set, so most stored sets are never looked at, instead of
+    comparing the query with every stored set.
+    """
+
+    _END = -1  # key that marks the end of a stored set in a trie node
+
+    def __init__(self, masks=()):
+        self.root: dict[int, dict] = {}
+        self.size: int = 0
+        for mask in masks:
+            self.add(mask)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, mask: int):
+        """Store a set.
+
+        Args:
+            mask (int): the set.
+        """
+        node = self.root
+        for position in bit_positions(mask):
+            node = node.setdefault(position, {})
+        if self._END not in node:
+            node[self._END] = {}
+            self.size += 1
+
+    def has_subset_of(self, mask: int) -> bool:
+        """Check whether a stored set is a subset of (or equal to) a set.
+
+        Args:
+            mask (int): the query set.
+
+        Returns:
+            bool: True if any stored set is a subset of mask.
+        """
+        positions = bit_positions(mask)
+        stack = [(self.root, 0)]
+        while stack:
+            node, start = stack.pop()
+            if self._END in node:
+                return True
+            for i in range(start, len(positions)):
+                child = node.get(positions[i])
+                if child is not None:
+                    stack.append((child, i + 1))
+        return False
+
+    def find_subset_of(self, mask: int) -> int | None:
+        """Find a stored set that is a subset of (or equal to) a set, see has_subset_of.
+
+        Args:
+            mask (int): the query set.
+
+        Returns:
+            int | None: one of the stored subsets of mask, or None if there is none.
+        """
+        positions = bit_positions(mask)
+        stack = [(self.root, 0, 0)]
+        while stack:
+            node, start, found = stack.pop()
+            if self._END in node:
+                return found
+            for i in range(start, len(positions)):
+                child = node.get(positions[i])
+                if child is not None:
+                    stack.append((child, i + 1, found | (1 << positions[i])))
+        return None
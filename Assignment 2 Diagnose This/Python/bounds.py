@@ -0,0 +1,52 @@
+from time import perf_counter
+from typing import Optional
+
+
+class SearchBounds:
+    """
+    Limits that turn the conflict set and hitting set searches into anytime searches.
+    The deadline starts when the bounds are created, so a single instance can bound a whole
+    diagnosis pipeline. A search that hits a bound stops and returns what it found so far, which
+    is recorded in complete: it stays True only if every search using these bounds ran to the end.
+    """
+    def __init__(self, max_size: Optional[int] = None, max_nodes: Optional[int] = None,
+                 time_limit: Optional[float] = None):
+        """
+        :param max_size: max cardinality of the diagnoses (hitting sets) to search for. Conflict sets
+                         are not limited by it, since small diagnoses can need large conflict sets.
+        :param max_nodes: max number of nodes per search: consistency checks for the conflict sets,
+                          created nodes for the hitting sets.
+        :param time_limit: max number of seconds from now.
+        """
+        self.max_size = max_size
+        self.max_nodes = max_nodes
+        self.deadline = perf_counter() + time_limit if time_limit is not None else None
+        self.complete = True
+
+
+    def unbounded(self) -> bool:
+        """
+        :return: True if no limit is set, so a search with these bounds always runs to the end.
+        """
+        return self.max_size is None and self.max_nodes is None and self.deadline is None
+
+
+    def exceeded(self, nodes: int) -> bool:
+        """
+        Checks whether a search has to stop, and if so marks the result as incomplete.
+
+        :param nodes: number of nodes the search used so far.
+        :return: True if the node budget is used up or the deadline has passed.
+        """
+        if (self.max_nodes is not None and nodes >= self.max_nodes) or \
+                (self.deadline is not None and perf_counter() >= self.deadline):
+            self.complete = False
+            return True
+        return False
+
+
+    def cut(self):
+        """
+        Marks the result as incomplete, for a search that skipped part of its search space.
+        """
+        self.complete = False
@@ -0,0 +1,239 @@
+from typing import Dict, List, Optional, Tuple
+import re
+
+
+GATE_TYPES = ("ANDG", "ORG", "XORG")
+SECTIONS = ("COMPONENTS", "BEHAVIOUR", "OBSERVATIONS", "OUTOBSERVATIONS")
+OPTIONAL_SECTIONS = ("PRIORS",)
+
+COMPONENT_PATTERN = re.compile(r"(ANDG|ORG|XORG)\((.+)\)")
+BEHAVIOUR_PATTERN = re.compile(r"(IN1|IN2)\((.+?)\)\s*=\s*OUT\((.+)\)")
+OBSERVATION_PATTERN = re.compile(r"((IN1|IN2)\((.+?)\))\s*=\s*([01])")
+OUT_OBSERVATION_PATTERN = re.compile(r"OUT\((.+)\)\s*=\s*([01])")
+PRIOR_PATTERN = re.compile(r"(.+?)\s*=\s*([0-9.eE+-]+)")
+
+# Priors have to be below this, so every component is more likely healthy than faulty,
+# which the best-first ranking of diagnoses relies on
+MAX_PRIOR = 0.5
+
+
+class Gate:
+    """
+    A single gate of a circuit.
+    Each of the two inputs is a tuple (from_observation, index): an index into the
+    in-observations of the circuit if from_observation is True, else the index of the gate
+    whose output is connected to the input.
+    """
+    __slots__ = ("name", "gate_type", "inputs")
+
+    def __init__(self, name: str, gate_type: str):
+        """
+        :param name: name of the gate, e.g. X1.
+        :param gate_type: one of GATE_TYPES.
+        """
+        self.name = name
+        self.gate_type = gate_type
+        self.inputs: List[Optional[Tuple[bool, int]]] = [None, None]
+
+
+class Circuit:
+    """
+    Typed model of a circuit file: the gates, their wiring and the observations.
+    """
+    def __init__(self):
+        self.gates: List[Gate] = []
+        self.gate_index: Dict[str, int] = {}  # gate name -> index in gates
+        self.in_observations: List[Tuple[str, bool]] = []  # e.g. ("IN1(X1)", True)
+        self.in_observation_index: Dict[str, int] = {}  # e.g. "IN1(X1)" -> index in in_observations
+        self.out_observations: List[Tuple[int, bool]] = []  # (gate index, observed output)
+        self.priors: Dict[str, float] = {}  # gate name -> prior probability that the gate is faulty
+
+
+    def gate_names(self) -> List[str]:
+        """
+        :return: the names of the gates, in file order.
+        """
+        return [gate.name for gate in self.gates]
+
+
+    def observation_names(self) -> List[str]:
+        """
+        :return: the names of the observed points, e.g. IN1(X1) and OUT(X2), in file order.
+        """
+        return [name for name, _ in self.in_observations] + \
+            [f"OUT({self.gates[gate].name})" for gate, _ in self.out_observations]
+
+
+    def canonical_form(self) -> str:
+        """
+        Text that is equal for circuit files that only differ in formatting or in the order of the
+        BEHAVIOUR and observation lines. The gates keep their file order, as results list gates in that order.
+
+        :return: the canonical form of the circuit and its observations.
+        """
+        def source(connection):
+            from_observation, index = connection
+            return self.in_observations[index][0] if from_observation else f"OUT({self.gates[index].name})"
+
+        lines = [f"{gate.gate_type}({gate.name}):{source(gate.inputs[0])},{source(gate.inputs[1])}"
+                 for gate in self.gates]
+        lines += sorted(f"{name}={int(value)}" for name, value in self.in_observations)
+        lines += sorted(f"OUT({self.gates[gate].name})={int(value)}" for gate, value in self.out_observations)
+        return "\n".join(lines)
+
+
+    def with_observations(self, values: Dict[str, bool]) -> "Circuit":
+        """
+        Creates a circuit with the same gates and wiring, but other observed values.
+        The gates are shared with this circuit, only the observations are copied.
+
+        :param values: observed value of observation names, e.g. {"IN1(X1)": True, "OUT(X2)": False}.
+                       Observations that are not given keep their value, an OUT of a gate that was not
+                       observed yet adds an out-observation.
+        :return: the new circuit.
+        """
+        circuit = Circuit()
+        circuit.gates = self.gates
+        circuit.gate_index = self.gate_index
+        circuit.in_observation_index = self.in_observation_index
+        circuit.priors = self.priors
+        circuit.in_observations = list(self.in_observations)
+        out_values = dict(self.out_observations)
+
+        for name, value in values.items():
+            match = OUT_OBSERVATION_PATTERN.fullmatch(f"{name}={int(bool(value))}")
+            if name in self.in_observation_index:
+                circuit.in_observations[self.in_observation_index[name]] = (name, bool(value))
+            elif match and match.group(1) in self.gate_index:
+                out_values[self.gate_index[match.group(1)]] = bool(value)
+            else:
+                raise ValueError(f"Unknown observation: {name}")
+
+        circuit.out_observations = list(out_values.items())
+        return circuit
+
+
+def parse_priors(lines: List[str], components) -> Dict[str, float]:
+    """
+    Parses failure priors, one per line like X1=0.05, from the PRIORS section or a side file,
+    and validates them against the components of the circuit.
+
+    :param lines: the lines with a prior.
+    :param components: names of the components of the circuit, e.g. Circuit.gate_index.
+    :return: the prior failure probability of every component on the lines.
+    """
+    priors = {}
+    errors = []
+    for line in lines:
+        match = PRIOR_PATTERN.fullmatch(line)
+        if not match:
+            raise Exception(f"Error reading prior: {line}")
+        try:
+            prior = float(match.group(2))
+        except ValueError:
+            raise Exception(f"Error reading prior: {line}")
+        if match.group(1) not in components:
+            errors.append(f"- unknown component {match.group(1)} in prior {line}.")
+        elif not 0 < prior < MAX_PRIOR:
+            errors.append(f"- prior of component {match.group(1)} is not between 0 and {MAX_PRIOR}: {line}.")
+        else:
+            priors[match.group(1)] = prior
+
+    if errors:
+        raise ValueError("Invalid priors:\n" + "\n".join(errors))
+    return priors
+
+
+def parse_circuit(document: str) -> Circuit:
+    """
+    Parses a circuit file in a single pass over its lines and validates it.
+
+    :param document: contents of the circuit file.
+    :return: the circuit model.
+    """
+    lines: Dict[str, List[str]] = {}
+    section = None
+    for line in document.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.endswith(":") and (line[:-1] in SECTIONS or line[:-1] in OPTIONAL_SECTIONS):
+            section = line[:-1]
+            lines[section] = []
+        elif section is not None and line == "END" + section:
+            section = None
+        elif section is not None:
+            lines[section].append(line)
+
+    for name in SECTIONS:
+        if name not in lines:
+            raise Exception(f"Missing {name} section")
+
+    circuit = Circuit()
+    for line in lines["COMPONENTS"]:
+        match = COMPONENT_PATTERN.fullmatch(line)
+        if not match:
+            raise Exception("Error reading components.")
+        circuit.gate_index[match.group(2)] = len(circuit.gates)
+        circuit.gates.append(Gate(match.group(2), match.group(1)))
+
+    # Count the connections of every input to report all wiring errors at once
+    connections = {name: {"IN1": 0, "IN2": 0} for name in circuit.gate_index}
+    errors = []
+
+    def connect(port, gate_name, source):
+        if gate_name not in circuit.gate_index:
+            errors.append(f"- unknown component {gate_name} in {port}({gate_name}).")
+            return
+        connections[gate_name][port] += 1
+        circuit.gates[circuit.gate_index[gate_name]].inputs[0 if port == "IN1" else 1] = source
+
+    for line in lines["BEHAVIOUR"]:
+        match = BEHAVIOUR_PATTERN.fullmatch(line)
+        if not match:
+            raise Exception(f"Error reading behaviour: {line}")
+        if match.group(3) not in circuit.gate_index:
+            errors.append(f"- unknown component {match.group(3)} in OUT({match.group(3)}).")
+            continue
+        connect(match.group(1), match.group(2), (False, circuit.gate_index[match.group(3)]))
+
+    for line in lines["OBSERVATIONS"]:
+        match = OBSERVATION_PATTERN.fullmatch(line)
+        if not match:
+            raise Exception(f"Error reading observation: {line}")
+        circuit.in_observation_index[match.group(1)] = len(circuit.in_observations)
+        circuit.in_observations.append((match.group(1), match.group(4) == "1"))
+        connect(match.group(2), match.group(3), (True, len(circuit.in_observations) - 1))
+
+    for line in lines["OUTOBSERVATIONS"]:
+        match = OUT_OBSERVATION_PATTERN.fullmatch(line)
+        if not match:
+            raise Exception(f"Error reading out observation: {line}")
+        if match.group(1) not in circuit.gate_index:
+            errors.append(f"- unknown component {match.group(1)} in OUT({match.group(1)}).")
+            continue
+        circuit.out_observations.append((circuit.gate_index[match.group(1)], match.group(2) == "1"))
+
+    for name, counts in connections.items():
+        if counts["IN1"] != 1 or counts["IN2"] != 1:
+            errors.append(
+                f"- component {name} has {counts['IN1']} IN1 connections and "
+                f"{counts['IN2']} IN2 connections.")
+
+    if errors:
+        raise ValueError("Invalid component connections:\n" + "\n".join(errors))
+
+    # Optional failure probabilities of the gates, e.g. X1=0.05
+    circuit.priors = parse_priors(lines.get("PRIORS", []), circuit.gate_index)
+    return circuit
+
+
+def read_circuit(document_path: str) -> Circuit:
+    """
+    Reads and parses a circuit file.
+
+    :param document_path: path to the circuit file.
+    :return: the circuit model.
+    """
+    with open(document_path, "r") as file:
+        return parse_circuit(file.read())
@@ -0,0 +1,89 @@
+from circuit import GATE_TYPES
+from typing import List, Optional
+import argparse
+import random
+
+
+GATE_PREFIXES = {"ANDG": "A", "ORG": "O", "XORG": "X"}
+GATE_FUNCTIONS = {"ANDG": lambda a, b: a & b, "ORG": lambda a, b: a | b, "XORG": lambda a, b: a ^ b}
+
+
+def generate_circuit(num_gates: int, num_faults: int = 1, connectivity: float = 0.6, seed: int = 0,
+                     depth: Optional[int] = None, max_fan_out: Optional[int] = None) -> str:
+    """
+    Generates a random circuit file with observations that show the effect of injected faults.
+    The gates are spread evenly over depth layers. Every input of a gate is connected to the output
+    of a gate in an earlier layer with probability connectivity, as long as that gate feeds fewer than
+    max_fan_out inputs, otherwise it becomes an in-observation with a random value.
+    The outputs of the gates that feed no other gate are observed. Faulty gates invert their output,
+    so the observations are inconsistent whenever a fault reaches an observed output.
+
+    :param num_gates: number of gates.
+    :param num_faults: number of gates whose output is inverted.
+    :param connectivity: chance that a gate input is wired to an earlier gate.
+    :param seed: seed of the random number generator.
+    :param depth: number of layers, every gate is its own layer by default.
+    :param max_fan_out: max number of inputs fed by one gate output, unlimited by default.
+    :return: contents of the circuit file.
+    """
+    rng = random.Random(seed)
+    depth = min(depth or num_gates, num_gates)
+    counts = {gate_type: 0 for gate_type in GATE_TYPES}
+    names: List[str] = []
+    types: List[str] = []
+    for _ in range(num_gates):
+        gate_type = rng.choice(GATE_TYPES)
+        counts[gate_type] += 1
+        names.append(f"{GATE_PREFIXES[gate_type]}{counts[gate_type]}")
+        types.append(gate_type)
+
+    # gates [layer_start[l], layer_start[l + 1]) form layer l
+    layer_start = [layer * num_gates // depth for layer in range(depth + 1)]
+    faulty = set(rng.sample(range(num_gates), min(num_faults, num_gates)))
+    values: List[int] = []
+    fan_out = [0] * num_gates
+    behaviour, observations = [], []
+
+    for layer in range(depth):
+        for g in range(layer_start[layer], layer_start[layer + 1]):
+            inputs = []
+            for port in ("IN1", "IN2"):
+                sources = [source for source in range(layer_start[layer])
+                           if max_fan_out is None or fan_out[source] < max_fan_out]
+                if sources and rng.random() < connectivity:
+                    source = rng.choice(sources)
+                    fan_out[source] += 1
+                    behaviour.append(f"{port}({names[g]})=OUT({names[source]})")
+                    inputs.append(values[source])
+                else:
+                    value = rng.randint(0, 1)
+                    observations.append(f"{port}({names[g]})={value}")
+                    inputs.append(value)
+            output = GATE_FUNCTIONS[types[g]](*inputs)
+            values.append(output ^ 1 if g in faulty else output)
+
+    out_observations = [f"OUT({names[g]})={values[g]}" for g in range(num_gates) if fan_out[g] == 0]
+
+    sections = [("COMPONENTS", [f"{gate_type}({name})" for gate_type, name in zip(types, names)]),
+                ("BEHAVIOUR", behaviour), ("OBSERVATIONS", observations), ("OUTOBSERVATIONS", out_observations)]
+    return "\n\n".join(f"{section}:\n" + "".join(line + "\n" for line in lines) + f"END{section}"
+                       for section, lines in sections) + "\n"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a random circuit file with injected faults")
+    parser.add_argument("gates", type=int, help="number of gates")
+    parser.add_argument("-o", "--output", help="output file, standard output if not given")
+    parser.add_argument("--faults", type=int, default=1, help="number of faulty gates")
+    parser.add_argument("--depth", type=int, default=None, help="number of layers of gates")
+    parser.add_argument("--fan-out", type=int, default=None, help="max inputs fed by one gate")
+    parser.add_argument("--connectivity", type=float, default=0.6, help="chance that an input is wired to a gate")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random number generator")
+    args = parser.parse_args()
+
+    document = generate_circuit(args.gates, args.faults, args.connectivity, args.seed, args.depth, args.fan_out)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(document)
+    else:
+        print(document, end="")
@@ -1,29 +1,72 @@
 from z3 import *
 from itertools import chain, combinations
-from typing import Tuple, List, Callable
-import re
+from typing import Tuple, List, Callable, Dict
+from time import perf_counter
+from circuit import parse_circuit
+from consistency import PropagationChecker
+from bitsets import SubsetIndex, bit_positions
+from bounds import SearchBounds
+from diagnosiscache import DiagnosisCache, resolve_cache
 
 
 class ConflictSetRetriever:
     """
     Class that handles reads in a file and finds the conflict sets.
     """
-    def __init__(self, document_path):
+    GATE_FUNCTIONS = {"ANDG": And, "ORG": Or, "XORG": Xor}
+    BACKENDS = ("z3", "native", "crosscheck")
+
+    def __init__(self, document_path, backend="z3", cache=False):
         """
         Opens file and handles logic to read the system description
 
         :param document_path: path to the circuit file.
+        :param backend: consistency checker: "z3" (reference), "native" (constraint propagation,
+                        falls back to z3 for checks that need too much search) or "crosscheck"
+                        (runs both and raises an AssertionError when they disagree).
+        :param cache: True for the default on-disk cache of conflict sets, False (the default) for none,
+                      or a DiagnosisCache, see resolve_cache.
         """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown consistency backend: {backend}")
+        self.backend = backend
         self.document_path = document_path
+        start = perf_counter()
         self.document = self.read_document()
-        self.validate_file()
+        self.circuit = parse_circuit(self.document)  # also validates the file
+        self.file_circuit = self.circuit  # observations of the file, the base of set_observations
+        self.parse_time = perf_counter() - start
 
+        start = perf_counter()
         self.in_variables = self.extract_in_observations()
         self.out_variables = self.extract_out_observations()
         self.comps, self.all_gates = self.extract_gates()
         self.fault_assumptions = self.make_fault_assumptions()
         self.observations = self.extract_observations()
 
+        # The circuit and observations are asserted once, the health of the gates
+        # is passed as assumption literals to every check. The observations are in their
+        # own scope, so set_observations can replace them without encoding the circuit again.
+        self.solver = Solver()
+        self.solver.add(*self.fault_assumptions)
+        self.solver.push()
+        self.solver.add(*self.observations)
+        self.health_literals = [Not(g) for g in self.all_gates]
+        self.literal_index = {literal.get_id(): i for i, literal in enumerate(self.health_literals)}
+        self.native = PropagationChecker(self.circuit) if backend != "z3" else None
+        self.encode_time = perf_counter() - start
+
+        self.cache: DiagnosisCache = resolve_cache(cache)
+        self.cache_hit = False  # whether the last retrieve_conflict_sets came from the cache
+        self.solver_calls = 0
+        self.solver_time = 0.0
+        self.native_fallbacks = 0  # native checks that were handed to z3
+        # Subsets the lattice engine did not have to check in the last retrieve_conflict_sets,
+        # None if that was not a complete lattice walk (another engine, a cache hit or a limit)
+        self.solver_calls_saved = None
+        self._last_healthy = []  # gates of the last check, the core when z3 was not used
+        self._core_from_z3 = False
+
 
     def read_document(self) -> str:
         """
@@ -39,114 +82,35 @@ class ConflictSetRetriever:
         """
         Checks if the circuit file has a correct format, throws error if not.
         """
-        comp_section = re.search(r"COMPONENTS:\s*(.*?)\s*ENDCOMPONENTS", self.document, re.DOTALL)
-        if not comp_section:
-            raise Exception("Missing COMPONENTS section")
-
-        behaviour_section = re.search(r"BEHAVIOUR:\s*(.*?)\s*ENDBEHAVIOUR", self.document, re.DOTALL)
-        if not behaviour_section:
-            raise Exception("Missing BEHAVIOUR section")
-
-        observation_section = re.search(r"OBSERVATIONS:\s*(.*?)\s*ENDOBSERVATIONS", self.document, re.DOTALL)
-        if not observation_section:
-            raise Exception("Missing OBSERVATION section")
-
-        out_observation_section = re.search(r"OUTOBSERVATIONS:\s*(.*?)\s*ENDOUTOBSERVATIONS", self.document, re.DOTALL)
-        if not out_observation_section:
-            raise Exception("Missing OUTOBSERVATION section")
-
-        components = re.findall(r"\((.*?)\)", comp_section.group(1))
-
-        # Count IN1 and IN2 for each component
-        in_counts = {comp: {"IN1": 0, "IN2": 0} for comp in components}
-
-        for comp in components:
-            in_counts[comp]["IN1"] = len(
-                re.findall(rf"\bIN1\({re.escape(comp)}\)\s*=", self.document))
-            in_counts[comp]["IN2"] = len(
-                re.findall(rf"\bIN2\({re.escape(comp)}\)\s*=", self.document))
-
-        errors = []
-        for comp, counts in in_counts.items():
-            if counts["IN1"] != 1 or counts["IN2"] != 1:
-                errors.append(
-                    f"- component {comp} has {counts['IN1']} IN1 connections and "
-                    f"{counts['IN2']} IN2 connections.")
-
-        if errors:
-            raise ValueError("Invalid component connections:\n" + "\n".join(errors))
+        parse_circuit(self.document)
 
 
     def extract_in_observations(self) -> List[z3.z3.BoolRef]:
         """
-        Reads in the in-observations and stores them as list of Z3 Bools.
+        Creates a Z3 Bool for every in-observation, e.g. IN1(X1).
 
         :return: list of Z3 Bools.
         """
-        match = re.search(r"\s*OBSERVATIONS:(.*?)ENDOBSERVATIONS", self.document, re.DOTALL)
-        if not match:
-            raise Exception("No observations found.")
-        else:
-            observations_string = match.group(1)
-            observations = observations_string.split("\n")
-            observations = list(filter(len, observations))  # remove empty strings
-
-            obs_names = []
-            for observation in observations:
-                obs_name = observation.split("=")[0]
-                obs_names.append(Bools(obs_name)[0])  # only store e.g. IN1(X1)
-            return obs_names
+        return [Bool(name) for name, _ in self.circuit.in_observations]
 
 
     def extract_out_observations(self) -> List[z3.z3.BoolRef]:
         """
-        Reads in the out-observations and stores them as list of Z3 Bools.
+        Creates a Z3 Bool for every out-observation, e.g. OUT(X2).
 
         :return: list of Z3 Bools.
         """
-        match = re.search(r"\s*OUTOBSERVATIONS:(.*?)ENDOUTOBSERVATIONS", self.document, re.DOTALL)
-        if not match:
-            raise Exception("No observations found.")
-        else:
-            observations_string = match.group(1)
-            observations = observations_string.split("\n")
-            observations = list(filter(len, observations))  # remove empty strings
-
-            obs_names = []
-            for observation in observations:
-                obs_name = observation.split("=")[0]
-                obs_names.append(Bools(obs_name)[0])  # only store e.g. OUT(X2)
-                
-            return obs_names
+        return [Bool(f"OUT({self.circuit.gates[gate].name})") for gate, _ in self.circuit.out_observations]
 
 
     def extract_gates(self) -> Tuple[List[z3.z3.BoolRef], List[z3.z3.BoolRef]]:
         """
-        Reads in the gate names. Used for both the gates and gate output.
-        Discards gate type.
+        Creates the Z3 Bools of the gates. Used for both the gate output and the gate fault flag.
 
-        :return: list of Z3 Bools of gate names and gate output names
+        :return: list of Z3 Bools of gate output names (e.g. X1_gate) and gate names (e.g. X1)
         """
-
-        match = re.search(r"\s*COMPONENTS:(.*?)ENDCOMPONENTS", self.document, re.DOTALL)
-        if not match:
-            raise Exception("No components found.")
-        else:
-            components_string = match.group(1)
-            components = components_string.split("\n")
-            components = list(filter(len, components))  # remove empty strings
-
-            comp_names = []
-            comp_out_names = []
-            for component in components:
-                comp_name = re.search(r"\((.+)\)", component)
-                if not comp_name:
-                    raise Exception("Error reading components.")
-                else:
-                    comp_names.append(Bools(comp_name.group(1) + "_gate")[0])
-                    comp_out_names.append(Bools(comp_name.group(1))[0])
-            
-            return comp_names, comp_out_names  # e.g. X1, X1_gate
+        names = self.circuit.gate_names()
+        return [Bool(name + "_gate") for name in names], [Bool(name) for name in names]
 
 
     @staticmethod
@@ -171,26 +135,8 @@ class ConflictSetRetriever:
         :param comp_out: the gate to find the type of
         :return: the gate type as Z3 function
         """
-        match = re.search(r"\s*COMPONENTS:(.*?)ENDCOMPONENTS", self.document, re.DOTALL)
-        if not match:
-            raise Exception("No components found.")
-        else:
-            components_string = match.group(1)
-            components = components_string.split("\n")
-            components = list(filter(len, components))  # remove empty strings
-            for component in components:
-                comp_regex = re.search(r"(ANDG|ORG|XORG)\((.+)\)", component)
-                if not comp_regex:
-                    raise Exception("Error reading components.")
-                else:
-                    if comp_regex.group(2) == str(comp_out):
-                        gate = comp_regex.group(1)
-                        if gate == "ANDG":
-                            return And
-                        elif gate == "ORG":
-                            return Or
-                        elif gate == "XORG":
-                            return Xor
+        gate = self.circuit.gates[self.circuit.gate_index[str(comp_out)]]
+        return self.GATE_FUNCTIONS[gate.gate_type]
 
 
     def find_inputs(self, comp_out) -> Tuple[Tuple[int, bool], Tuple[int, bool]]:
@@ -202,33 +148,8 @@ class ConflictSetRetriever:
         :return: Index of component a and b,
                  bool if it can be found in observations or behaviour in file
         """
-        match_a = re.search(rf"(IN1\({comp_out}\))=(0|1|OUT\((.+)\))\n", self.document)
-        match_b = re.search(rf"(IN2\({comp_out}\))=(0|1|OUT\((.+)\))\n", self.document)
-
-        if not match_a or not match_b:
-            raise Exception("No two inputs found for this component.")
-        else:
-            in_variables_strings = [str(variable) for variable in self.in_variables]
-            comp_out_strings = [str(comp) for comp in self.all_gates]
-
-            # if input_a is from an observation:
-            if match_a.group(2) == "0" or match_a.group(2) == "1":
-                in_a = in_variables_strings.index(match_a.group(1))
-                obs_a = True
-            # if input_a arises from circuit behaviour:
-            else:
-                in_a = comp_out_strings.index(match_a.group(3))
-                obs_a = False
-            # if input_b is from an observation:
-            if match_b.group(2) == "0" or match_b.group(2) == "1":
-                in_b = in_variables_strings.index(match_b.group(1))
-                obs_b = True
-            # if input_b arises from circuit behaviour:
-            else:
-                in_b = comp_out_strings.index(match_b.group(3))
-                obs_b = False
-
-            return (in_a, obs_a), (in_b, obs_b)
+        (obs_a, in_a), (obs_b, in_b) = self.circuit.gates[self.circuit.gate_index[str(comp_out)]].inputs
+        return (in_a, obs_a), (in_b, obs_b)
         
 
     def make_fault_assumptions(self) -> List[z3.z3.BoolRef]:
@@ -240,26 +161,17 @@ class ConflictSetRetriever:
         fault_assumptions = []
 
         # a fault assumption is needed for every single gate:
-        for comp, comp_out in zip(self.comps, self.all_gates):
-            gate = self.find_corresponding_gate_type(comp_out)
-            (input_a, obs_a), (input_b, obs_b) = self.find_inputs(comp_out)
-
+        for gate, comp, comp_out in zip(self.circuit.gates, self.comps, self.all_gates):
             # handling which in-variables or components to take for each gate:
-            if obs_a:
-                input_a = self.in_variables[input_a]
-            else:
-                input_a = self.comps[input_a]
-            if obs_b:
-                input_b = self.in_variables[input_b]
-            else:
-                input_b = self.comps[input_b]
+            input_a, input_b = [self.in_variables[index] if from_observation else self.comps[index]
+                                for from_observation, index in gate.inputs]
 
             # fault assumption consists of:
             # - component
             # - gate type
             # - input a & b
             # - component output
-            fault_assumptions.append(self.faulted(comp, gate(input_a, input_b), comp_out))
+            fault_assumptions.append(self.faulted(comp, self.GATE_FUNCTIONS[gate.gate_type](input_a, input_b), comp_out))
 
         return fault_assumptions
 
@@ -270,36 +182,29 @@ class ConflictSetRetriever:
 
         :return: list of observation with truth values.
         """
-        match = re.search(r"\s*OBSERVATIONS:(.*?)ENDOBSERVATIONS", self.document, re.DOTALL)
-        all_observations = []
-        if not match:
-            raise Exception("No observations found.")
-        else:
-            observations_string = match.group(1)
-            observations = observations_string.split("\n")
-            observations = list(filter(len, observations))  # remove empty strings
+        all_observations = [variable == value
+                            for variable, (_, value) in zip(self.in_variables, self.circuit.in_observations)]
+        all_observations += [self.comps[gate] == value for gate, value in self.circuit.out_observations]
+        return all_observations
 
-            for i, observation in enumerate(observations):
-                value = bool(int(observation.split("=")[1]))
-                all_observations.append(self.in_variables[i] == value)
 
-        match = re.search(r"\s*OUTOBSERVATIONS:(.*?)ENDOUTOBSERVATIONS", self.document, re.DOTALL)
-        if not match:
-            raise Exception("No out observations found.")
-        else:
-            observations_string = match.group(1)
-            observations = observations_string.split("\n")
-            observations = list(filter(len, observations))  # remove empty strings
-
-            for observation in observations:
-                for j, comp in enumerate(self.all_gates):
-                    component_match = re.search(r"OUT\((.+)\)", observation)
-                    if not component_match:
-                        raise Exception("No component found")
-                    if component_match.group(1) == str(comp):
-                        value = bool(int(observation.split("=")[1]))
-                        all_observations.append(self.comps[j] == value)
-        return all_observations
+    def set_observations(self, values: Dict[str, bool]):
+        """
+        Replaces observed values, keeping the encoded circuit in the solver.
+        The values are applied to the observations of the file, not to those of an earlier call,
+        so the result never depends on the observation vectors that were set before.
+
+        :param values: observed value of observation names, e.g. {"IN1(X1)": True, "OUT(X2)": False},
+                       see Circuit.with_observations.
+        """
+        self.circuit = self.file_circuit.with_observations(values)
+        self.out_variables = self.extract_out_observations()
+        self.observations = self.extract_observations()
+        self.solver.pop()
+        self.solver.push()
+        self.solver.add(*self.observations)
+        if self.native is not None:
+            self.native = PropagationChecker(self.circuit)
 
 
     @staticmethod
@@ -314,34 +219,269 @@ class ConflictSetRetriever:
         return chain.from_iterable(combinations(s, r) for r in range(1, len(s) + 1))
 
 
-    def retrieve_conflict_sets(self) -> List[List[str]]:
+    def is_consistent(self, healthy_gates) -> bool:
+        """
+        Checks whether the observations are consistent with the given gates being healthy.
+        Gates that are not assumed healthy are unconstrained, which is equivalent to
+        assuming them faulty as a faulty gate can produce any output.
+
+        :param healthy_gates: iterable of indices into all_gates of the gates assumed healthy.
+        :return: True if consistent, False if the gates form a conflict set.
+        """
+        healthy_gates = list(healthy_gates)
+        self._last_healthy = healthy_gates
+
+        start = perf_counter()
+        if self.backend == "z3":
+            result = self.z3_consistent(healthy_gates)
+        else:
+            result = self.native.is_consistent(healthy_gates)
+            if result is None:
+                self.native_fallbacks += 1
+                result = self.z3_consistent(healthy_gates)
+            elif self.backend == "crosscheck":
+                reference = self.z3_consistent(healthy_gates)
+                assert result == reference, (
+                    f"Backends disagree for healthy gates {[str(self.all_gates[i]) for i in healthy_gates]}: "
+                    f"z3 {reference}, native {result}")
+            else:
+                self._core_from_z3 = False
+        self.solver_time += perf_counter() - start
+        self.solver_calls += 1
+
+        return result
+
+
+    def z3_consistent(self, healthy_gates) -> bool:
+        """
+        Consistency check with z3, using the health of the gates as assumption literals.
+
+        :param healthy_gates: list of indices into all_gates of the gates assumed healthy.
+        :return: True if consistent, False if the gates form a conflict set.
+        """
+        self._core_from_z3 = True
+        return self.solver.check(*[self.health_literals[i] for i in healthy_gates]) != unsat
+
+
+    def last_core(self) -> List[int]:
+        """
+        Unsat core of the last inconsistent check, not necessarily minimal.
+        The native backend does not compute cores, so then all gates of the check are returned.
+
+        :return: indices of the gates whose health assumptions are in the core.
+        """
+        if not self._core_from_z3:
+            return sorted(self._last_healthy)
+        return sorted(self.literal_index[literal.get_id()] for literal in self.solver.unsat_core())
+
+
+    def queries_per_second(self) -> float:
+        """
+        :return: the number of consistency checks per second of solver time.
+        """
+        return self.solver_calls / self.solver_time if self.solver_time else 0.0
+
+
+    def quickxplain(self, candidates) -> List[int]:
         """
-        Handles all z3 logic to retrieve the conflict sets.
+        QuickXplain: finds a minimal conflict set within a set of gates that is known to be a conflict.
+        Splits the candidates in halves and only keeps the parts needed for the contradiction.
 
+        :param candidates: list of gate indices that together form a conflict set.
+        :return: minimal conflict set as list of gate indices.
+        """
+        def explain(background, has_delta, gates):
+            if has_delta and not self.is_consistent(background):
+                return []
+            if len(gates) == 1:
+                return gates
+            half = len(gates) // 2
+            delta_2 = explain(background + gates[:half], True, gates[half:])
+            delta_1 = explain(background + delta_2, len(delta_2) > 0, gates[:half])
+            return delta_1 + delta_2
+
+        return sorted(explain([], False, list(candidates)))
+
+
+    def retrieve_conflict_sets(self, engine="powerset", bounds: SearchBounds = None) -> List[List[str]]:
+        """
+        Handles all z3 logic to retrieve the minimal conflict sets.
+
+        :param engine: "powerset" checks every subset of gates and filters for minimality afterwards,
+                       "marco" enumerates only the minimal conflict sets directly,
+                       "lattice" walks the subsets and skips subtrees whose outcome is already known.
+        :param bounds: optional node (consistency check) and time limits. When one is hit, the minimal
+                       conflict sets found so far are returned and bounds.complete is set to False.
+                       The cache is only used without limits.
         :return: list of list of z3 variables, which are the conflict sets.
         """
-        conflict_sets = []
-        s = Solver()
+        self.solver_calls_saved = None
+        use_cache = self.cache is not None and (bounds is None or bounds.unbounded())
+        key = self.cache.conflict_key(self.circuit.canonical_form(), engine) if use_cache else None
+        cached = self.cache.get(key) if key else None
+        self.cache_hit = cached is not None
+        if cached is not None:
+            return cached
+
+        bounds = bounds if bounds is not None else SearchBounds()
+        if engine == "powerset":
+            minimal_conflicts = self.powerset_conflicts(bounds)
+        elif engine == "marco":
+            minimal_conflicts = self.marco_conflicts(bounds)
+        elif engine == "lattice":
+            minimal_conflicts = self.lattice_conflicts(bounds)
+        else:
+            raise ValueError(f"Unknown conflict set engine: {engine}")
 
-        for healthy_combo in self.powerset(self.all_gates):
-            s.add(*self.fault_assumptions, *self.observations)
+        conflict_sets = [[str(self.all_gates[i]) for i in sublist] for sublist in minimal_conflicts]
+        if key:
+            self.cache.put(key, conflict_sets)
+        return conflict_sets
 
-            # Assume gates in the combination are healthy (fault_flag == False)
-            for g in self.all_gates:
-                if g in healthy_combo:
-                    s.add(g == False)  # Healthy
-                else:
-                    s.add(g == True)  # Faulty
 
-            # If assuming all of these are healthy leads to contradiction -> it is a conflict set
-            if s.check() == unsat:
-                conflict_sets.append(set(healthy_combo))
+    def powerset_conflicts(self, bounds: SearchBounds) -> List[List[int]]:
+        """
+        Brute force: checks every subset of gates, then removes the non-minimal conflict sets.
 
-            s.reset()
+        :param bounds: node and time limits, checked before every subset.
+        :return: minimal conflict sets as lists of gate indices.
+        """
+        conflict_sets = []
+        calls_before = self.solver_calls
 
+        for healthy_combo in self.powerset(range(len(self.all_gates))):
+            if bounds.exceeded(self.solver_calls - calls_before):
+                break
+            # If assuming all of these are healthy leads to contradiction -> it is a conflict set
+            if not self.is_consistent(healthy_combo):
+                conflict_sets.append(healthy_combo)
+
+        # The powerset is ordered by size, so every smaller conflict set is indexed before its supersets
         minimal_conflicts = []
+        minimal_index = SubsetIndex()
         for cs in conflict_sets:
-            if all(not cs > other for other in conflict_sets):
-                minimal_conflicts.append(list(cs))
+            mask = sum(1 << gate for gate in cs)
+            if not minimal_index.has_subset_of(mask):
+                minimal_index.add(mask)
+                minimal_conflicts.append(sorted(cs))
+
+        return minimal_conflicts
+
+
+    def marco_conflicts(self, bounds: SearchBounds) -> List[List[int]]:
+        """
+        MARCO: enumerates the minimal conflict sets (minimal unsatisfiable subsets) directly.
+        A map solver proposes subsets of gates that are not yet covered by a found result.
+        Inconsistent subsets are shrunk to a minimal conflict set with the unsat core and QuickXplain,
+        consistent subsets are grown to a maximal consistent set.
+        Results are blocked in the map solver, so every subset of the lattice is only explored once.
+
+        :param bounds: node and time limits, checked before every seed.
+        :return: minimal conflict sets as lists of gate indices, ordered by size like the powerset engine.
+        """
+        n = len(self.all_gates)
+        in_set = [Bool(f"__map_{i}") for i in range(n)]
+        map_solver = Solver()
+        minimal_conflicts = []
+        calls_before = self.solver_calls
+
+        while not bounds.exceeded(self.solver_calls - calls_before) and map_solver.check() == sat:
+            model = map_solver.model()
+            seed = [i for i in range(n) if is_true(model.eval(in_set[i], model_completion=True))]
+
+            if self.is_consistent(seed):
+                # Grow to a maximal consistent set, every conflict needs a gate outside of it
+                for i in range(n):
+                    if i not in seed and self.is_consistent(seed + [i]):
+                        seed.append(i)
+                outside = [in_set[i] for i in range(n) if i not in seed]
+                if not outside:
+                    break  # all gates together are consistent, so there are no conflicts
+                map_solver.add(Or(outside))
+            else:
+                conflict = self.quickxplain(self.last_core())
+                minimal_conflicts.append(conflict)
+                # Block the conflict and all of its supersets
+                map_solver.add(Or([Not(in_set[i]) for i in conflict]))
+
+        return sorted(minimal_conflicts, key=lambda cs: (len(cs), cs))
+
 
-        return [[str(item) for item in sublist] for sublist in minimal_conflicts]
+    def lattice_conflicts(self, bounds: SearchBounds) -> List[List[int]]:
+        """
+        Searches the subset lattice top-down from the empty set, using that conflict-ness is monotone.
+        A node is a set of gates P with a set of gates A that may still be added, its subtree holds
+        P plus every subset of A. The node is checked, or skipped when the outcome is already known:
+        - if P contains a known conflict set, so does every set in the subtree, which is skipped;
+        - if P is inside a known maximal consistent set M, P is consistent and is not checked.
+        A consistent P is grown to a maximal consistent set M, first with the gates of A so it covers
+        as much of the subtree as possible. The sets in the subtree that are inside M are consistent,
+        so the children only cover the sets with a gate of A outside M: child i adds the i-th such
+        gate and leaves out the ones before it, so every set is in one subtree at most. A subtree
+        that is inside M is therefore never built at all.
+        An inconsistent P is shrunk to a minimal conflict set with QuickXplain. Every minimal conflict
+        set is found: the path to it only goes through its proper subsets, which are consistent.
+        Both kinds of known sets are kept in a set-trie; a maximal consistent set is stored as its
+        complement, since a set is inside it exactly when its complement contains the stored one.
+        Sets are represented as bitmasks, with gate i as bit i.
+
+        :param bounds: node and time limits, checked before every node.
+        :return: minimal conflict sets as lists of gate indices, ordered by size like the powerset engine.
+        """
+        n = len(self.all_gates)
+        full = (1 << n) - 1
+        calls_before = self.solver_calls
+        conflicts = SubsetIndex()  # bitmasks of the minimal conflict sets
+        consistent = SubsetIndex()  # complements of the bitmasks of maximal consistent sets
+        minimal_conflicts = []
+
+        stack = [(0, full)]  # (gates assumed healthy, gates that may still be added)
+        while stack:
+            if bounds.exceeded(self.solver_calls - calls_before):
+                return sorted(minimal_conflicts, key=lambda cs: (len(cs), cs))
+            mask, allowed = stack.pop()
+            if conflicts.has_subset_of(mask):
+                continue
+
+            outside = consistent.find_subset_of(full & ~mask)
+            if outside is None:
+                if not self.is_consistent(self.mask_to_gates(mask)):
+                    conflict = self.quickxplain(self.last_core())
+                    conflicts.add(sum(1 << gate for gate in conflict))
+                    minimal_conflicts.append(conflict)
+                    continue
+                grown = self.grow_consistent(mask, bit_positions(allowed) + bit_positions(full & ~allowed))
+                outside = full & ~grown
+                consistent.add(outside)
+
+            children = []
+            for gate in bit_positions(allowed & outside):
+                allowed &= ~(1 << gate)
+                children.append((mask | (1 << gate), allowed))
+            stack.extend(reversed(children))  # the child with the lowest gate is expanded first
+
+        self.solver_calls_saved = (2 ** n - 1) - (self.solver_calls - calls_before)
+        return sorted(minimal_conflicts, key=lambda cs: (len(cs), cs))
+
+
+    def grow_consistent(self, mask, order: List[int] = None) -> int:
+        """
+        Greedily adds gates to a consistent set as long as it stays consistent.
+
+        :param mask: bitmask of a consistent set of gates.
+        :param order: order in which the gates are tried, by index by default.
+        :return: bitmask of a maximal consistent set containing it.
+        """
+        for gate in order if order is not None else range(len(self.all_gates)):
+            bit = 1 << gate
+            if not mask & bit and self.is_consistent(self.mask_to_gates(mask | bit)):
+                mask |= bit
+        return mask
+
+
+    def mask_to_gates(self, mask) -> List[int]:
+        """
+        :param mask: bitmask of gates, with gate i as bit i.
+        :return: the gate indices in the bitmask.
+        """
+        return [gate for gate in range(len(self.all_gates)) if mask >> gate & 1]
@@ -0,0 +1,143 @@
+from circuit import Circuit
+from typing import Iterable, List, Optional
+
+
+# Rows (input a, input b, output) of the truth table of every gate type
+TRUTH_TABLES = {
+    gate_type: [(a, b, function(a, b)) for a in (0, 1) for b in (0, 1)]
+    for gate_type, function in (("ANDG", lambda a, b: a & b), ("ORG", lambda a, b: a | b), ("XORG", lambda a, b: a ^ b))
+}
+
+UNKNOWN = -1
+
+
+class PropagationChecker:
+    """
+    Consistency checker that works directly on the circuit model instead of using Z3.
+    Every wire is a variable: the in-observations are fixed, the gate outputs are unknown unless observed.
+    Healthy gates are constraints between their input and output variables, faulty gates constrain nothing.
+    Observed values are propagated forward and backward through the healthy gates, and only
+    when that is not enough a small search over the remaining unknown outputs is done.
+    """
+    def __init__(self, circuit: Circuit, max_branches: int = 10000):
+        """
+        :param circuit: the circuit model.
+        :param max_branches: max number of search branches for a single check before giving up.
+        """
+        self.max_branches = max_branches
+        n_obs = len(circuit.in_observations)
+        self.initial = [int(value) for _, value in circuit.in_observations] + [UNKNOWN] * len(circuit.gates)
+        self.contradictory = False  # the out-observations contradict each other
+
+        for gate, value in circuit.out_observations:
+            if self.initial[n_obs + gate] not in (UNKNOWN, int(value)):
+                self.contradictory = True
+            self.initial[n_obs + gate] = int(value)
+
+        # variables (input a, input b, output) of every gate
+        self.gate_variables = [
+            tuple([index if from_observation else n_obs + index for from_observation, index in gate.inputs] + [n_obs + g])
+            for g, gate in enumerate(circuit.gates)
+        ]
+        self.tables = [TRUTH_TABLES[gate.gate_type] for gate in circuit.gates]
+
+        # gates connected to every variable, to know which constraints to revisit after an assignment
+        self.variable_gates: List[List[int]] = [[] for _ in self.initial]
+        for g, variables in enumerate(self.gate_variables):
+            for variable in set(variables):
+                self.variable_gates[variable].append(g)
+
+        self.branches = 0
+
+
+    def is_consistent(self, healthy_gates: Iterable[int]) -> Optional[bool]:
+        """
+        Checks whether the observations are consistent with the given gates being healthy.
+
+        :param healthy_gates: iterable of gate indices assumed healthy.
+        :return: True if consistent, False if not, None if the search took more than max_branches branches.
+        """
+        if self.contradictory:
+            return False
+
+        active = [False] * len(self.gate_variables)
+        for g in healthy_gates:
+            active[g] = True
+
+        values = self.initial.copy()
+        if not self.propagate(values, active, [g for g, is_active in enumerate(active) if is_active]):
+            return False
+
+        self.branches = 0
+        return self.search(values, active)
+
+
+    def allowed_rows(self, gate: int, values: List[int]) -> List[tuple]:
+        """
+        :param gate: gate index.
+        :param values: current value of every variable.
+        :return: the rows of the truth table of the gate that match the known values.
+        """
+        variables = self.gate_variables[gate]
+        rows = []
+        for row in self.tables[gate]:
+            assignment = {}
+            for variable, bit in zip(variables, row):
+                if values[variable] not in (UNKNOWN, bit) or assignment.setdefault(variable, bit) != bit:
+                    break
+            else:
+                rows.append(row)
+        return rows
+
+
+    def propagate(self, values: List[int], active: List[bool], queue: List[int]) -> bool:
+        """
+        Assigns every variable whose value is implied by a healthy gate, until nothing changes.
+
+        :param values: current value of every variable, updated in place.
+        :param active: for every gate whether it is assumed healthy.
+        :param queue: gates to revise.
+        :return: False if a contradiction was found.
+        """
+        while queue:
+            gate = queue.pop()
+            rows = self.allowed_rows(gate, values)
+            if not rows:
+                return False
+
+            for position, variable in enumerate(self.gate_variables[gate]):
+                if values[variable] == UNKNOWN and all(row[position] == rows[0][position] for row in rows):
+                    values[variable] = rows[0][position]
+                    queue.extend(g for g in self.variable_gates[variable] if active[g] and g != gate)
+        return True
+
+
+    def search(self, values: List[int], active: List[bool]) -> Optional[bool]:
+        """
+        Tries both values for an unknown variable of a healthy gate that is not yet decided.
+
+        :param values: current value of every variable, after propagation.
+        :param active: for every gate whether it is assumed healthy.
+        :return: True if an assignment satisfies all healthy gates, False if none does,
+                 None if the search took more than max_branches branches.
+        """
+        undecided = next((variable for g, is_active in enumerate(active) if is_active
+                          for variable in self.gate_variables[g] if values[variable] == UNKNOWN), None)
+        if undecided is None:
+            return True  # every healthy gate is fully assigned and was checked during propagation
+
+        result = False
+        for bit in (0, 1):
+            self.branches += 1
+            if self.branches > self.max_branches:
+                return None
+
+            branch = values.copy()
+            branch[undecided] = bit
+            if self.propagate(branch, active, [g for g in self.variable_gates[undecided] if active[g]]):
+                outcome = self.search(branch, active)
+                if outcome:
+                    return True
+                if outcome is None:
+                    result = None
+        return result
@@ -0,0 +1,195 @@
+from bitsets import ComponentIndex
+from collections import OrderedDict
+from typing import List, Optional
+import hashlib
+import json
+import os
+
+
+# Part of every key, increase it when a change to the engines can change their results
+ENGINE_VERSION = 1
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".diagnosis_cache")
+
+
+class DiagnosisCache:
+    """
+    Persistent cache of conflict sets and diagnoses, one small file per entry in a directory.
+    Every entry stores the component names once and the sets as lists of indices into them,
+    which keeps the order of the components in every set.
+    The total size of the files is bounded: the least recently used entries (by modification
+    time, which is refreshed on every hit) are removed when a new entry does not fit.
+    The directory is only scanned once, when the cache is opened. After that an index of the entries
+    in order of use and their total size are kept up to date, so storing an entry does not touch the
+    other files. Entries that other processes store later are added to the index when they are read.
+    """
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = 16 * 1024 * 1024):
+        """
+        :param directory: directory of the cache files, created when the first entry is stored.
+        :param max_bytes: max total size of the cache files.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizes: OrderedDict[str, int] = OrderedDict()  # file name -> size, least recently used first
+        self._total_bytes = 0
+        self._scan()
+
+
+    @staticmethod
+    def conflict_key(canonical_circuit: str, engine: str) -> str:
+        """
+        :param canonical_circuit: canonical form of the circuit and observations, see Circuit.canonical_form.
+        :param engine: conflict set engine.
+        :return: key of the conflict sets of the circuit.
+        """
+        return hashlib.sha256(f"conflicts\n{ENGINE_VERSION}\n{engine}\n{canonical_circuit}".encode()).hexdigest()
+
+
+    @staticmethod
+    def diagnosis_key(conflict_sets: List[List[str]], heuristic: str) -> str:
+        """
+        :param conflict_sets: conflict sets, which fully determine the minimal diagnoses.
+        :param heuristic: name of the heuristic of the hitting set algorithm, which determines their order.
+        :return: key of the minimal diagnoses of the conflict sets.
+        """
+        canonical = json.dumps([sorted(cs) for cs in conflict_sets])
+        return hashlib.sha256(f"diagnoses\n{ENGINE_VERSION}\n{heuristic}\n{canonical}".encode()).hexdigest()
+
+
+    def get(self, key: str) -> Optional[List[List[str]]]:
+        """
+        :param key: key of the entry.
+        :return: the stored sets, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r") as file:
+                entry = json.load(file)
+            os.utime(path)  # mark as recently used
+            if key + ".json" not in self._sizes:
+                self._add(key + ".json", os.path.getsize(path))  # stored by another process
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self._sizes.move_to_end(key + ".json")
+        self.hits += 1
+        return [[entry["components"][i] for i in s] for s in entry["sets"]]
+
+
+    def put(self, key: str, sets: List[List[str]]):
+        """
+        Stores sets, evicting the least recently used entries if the cache gets too large.
+        Failing to write is not an error, the cache is only an optimization.
+
+        :param key: key of the entry.
+        :param sets: the sets of component names.
+        """
+        components = ComponentIndex(component for s in sets for component in s)
+        entry = {"components": components.components,
+                 "sets": [[components.positions[component] for component in s] for s in sets]}
+        data = json.dumps(entry, separators=(",", ":")).encode()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first, so other processes never read half an entry
+            temporary = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, self._path(key))
+        except OSError:
+            return
+        self._add(key + ".json", len(data))
+        self._evict()
+
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        for name in self._entries():
+            os.remove(os.path.join(self.directory, name))
+        self._sizes.clear()
+        self._total_bytes = 0
+
+
+    def stats(self) -> str:
+        """
+        :return: the hits, misses and evictions as a single line.
+        """
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), {self.evictions} evictions"
+
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+
+    def _entries(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [name for name in os.listdir(self.directory) if name.endswith(".json")]
+
+
+    def _scan(self):
+        """
+        Builds the index from the files in the directory, ordered by modification time.
+        """
+        entries = []
+        for name in self._entries():
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        for _, size, name in sorted(entries):
+            self._add(name, size)
+
+
+    def _add(self, name: str, size: int):
+        """
+        Adds or replaces an entry in the index as the most recently used one.
+
+        :param name: file name of the entry.
+        :param size: size of the file in bytes.
+        """
+        self._total_bytes += size - self._sizes.pop(name, 0)
+        self._sizes[name] = size
+
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        while self._total_bytes > self.max_bytes and self._sizes:
+            name, size = self._sizes.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # evicted by another process
+            self._total_bytes -= size
+            self.evictions += 1
+
+
+_default_cache: Optional[DiagnosisCache] = None
+
+
+def resolve_cache(cache) -> Optional[DiagnosisCache]:
+    """
+    Turns the cache argument of the diagnosis functions into a cache.
+    The default cache can be switched off for a whole run with the environment variable DIAGNOSIS_CACHE=0.
+
+    :param cache: True for the shared default cache, False or None for no cache, or a DiagnosisCache.
+    :return: the cache to use, or None.
+    """
+    global _default_cache
+    if isinstance(cache, DiagnosisCache):
+        return cache
+    if not cache or os.environ.get("DIAGNOSIS_CACHE") == "0":
+        return None
+    if _default_cache is None:
+        _default_cache = DiagnosisCache()
+    return _default_cache
@@ -0,0 +1,142 @@
+from z3 import *
+from conflictsets import ConflictSetRetriever
+from bounds import SearchBounds
+from typing import Iterator, List, Tuple
+
+
+class DirectDiagnoser:
+    """
+    Diagnosis engine that enumerates the minimal diagnoses directly with the solver, without
+    conflict sets or hitting sets. The circuit is encoded with make_fault_assumptions of the
+    retriever, with the fault flags of the gates as free variables, and every model is a set of
+    faulty gates that explains the observations. Diagnoses are enumerated by increasing cardinality:
+    - "cardinality": asks for a model with at most k faulty gates, for k = 0, 1, 2, ...;
+    - "optimize": asks Z3's Optimize (MaxSAT) for a model with the fewest faulty gates.
+    Every diagnosis that is found is blocked together with all of its supersets. A model of the
+    smallest cardinality that is not blocked is always a minimal diagnosis: a smaller diagnosis
+    inside it would not be blocked either. So no minimality check is needed afterwards.
+    """
+    STRATEGIES = ("cardinality", "optimize")
+
+    def __init__(self, retriever: ConflictSetRetriever, strategy: str = "cardinality"):
+        """
+        :param retriever: retriever of the circuit, its encoding and current observations are used.
+        :param strategy: "cardinality" (iterated at-most-k constraints) or "optimize" (Z3 Optimize).
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        self.retriever = retriever
+        self.strategy = strategy
+        self.solver_calls = 0
+
+
+    def diagnose(self, bounds: SearchBounds = None) -> Tuple[List[List[str]], List[List[str]]]:
+        """
+        :param bounds: optional size, node (solver call) and time limits. When one is hit, the diagnoses
+                       found so far are returned and bounds.complete is set to False.
+        :return: the result of run_hitting_set_algorithm: the minimal diagnoses, smallest first, twice.
+        """
+        diagnoses = list(self.iter_diagnoses(bounds))
+        return diagnoses, diagnoses
+
+
+    def iter_diagnoses(self, bounds: SearchBounds = None) -> Iterator[List[str]]:
+        """
+        Generator version of diagnose: yields every minimal diagnosis as soon as it is found, smallest first.
+
+        :param bounds: optional size, node and time limits.
+        :return: iterator over the minimal diagnoses as lists of gate names.
+        """
+        bounds = bounds if bounds is not None else SearchBounds()
+        if self.strategy == "optimize":
+            return self._iter_optimize(bounds)
+        return self._iter_cardinality(bounds)
+
+
+    def _new_solver(self, solver):
+        """
+        :param solver: a Solver or Optimize.
+        :return: the solver with the circuit and the observations asserted.
+        """
+        solver.add(*self.retriever.fault_assumptions)
+        solver.add(*self.retriever.observations)
+        return solver
+
+
+    def _diagnosis(self, model) -> List[int]:
+        """
+        :param model: model of the encoding.
+        :return: indices of the gates that are faulty in the model.
+        """
+        return [i for i, gate in enumerate(self.retriever.all_gates)
+                if is_true(model.eval(gate, model_completion=True))]
+
+
+    def _block(self, solver, diagnosis: List[int]):
+        """
+        Excludes a diagnosis and all of its supersets from the models of the solver.
+
+        :param solver: a Solver or Optimize.
+        :param diagnosis: indices of the faulty gates.
+        """
+        solver.add(Or([Not(self.retriever.all_gates[i]) for i in diagnosis]))
+
+
+    def _names(self, diagnosis: List[int]) -> List[str]:
+        return [str(self.retriever.all_gates[i]) for i in diagnosis]
+
+
+    def _check(self, solver, *assumptions) -> CheckSatResult:
+        self.solver_calls += 1
+        return solver.check(*assumptions)
+
+
+    def _iter_cardinality(self, bounds: SearchBounds) -> Iterator[List[str]]:
+        """
+        Every cardinality bound gets a guard literal, so the bound is passed as an assumption
+        while the blocking clauses stay asserted for all later bounds. When a check fails without
+        the bound in its unsat core, the blocking clauses alone exclude every model, so all
+        diagnoses have been found and the larger bounds are skipped.
+        """
+        gates = self.retriever.all_gates
+        solver = self._new_solver(Solver())
+        max_size = len(gates) if bounds.max_size is None else min(bounds.max_size, len(gates))
+
+        for k in range(max_size + 1):
+            at_most = Bool(f"__at_most_{k}")
+            solver.add(Implies(at_most, AtMost(*gates, k)))
+            while True:
+                if bounds.exceeded(self.solver_calls):
+                    return
+                if self._check(solver, at_most) != sat:
+                    if not any(literal.eq(at_most) for literal in solver.unsat_core()):
+                        return
+                    break
+                diagnosis = self._diagnosis(solver.model())
+                if not diagnosis:
+                    return  # the observations are consistent with all gates healthy
+                self._block(solver, diagnosis)
+                yield self._names(diagnosis)
+
+        # Diagnoses larger than max_size were not searched for, see if there are any
+        if max_size < len(gates) and not bounds.exceeded(self.solver_calls) and self._check(solver) == sat:
+            bounds.cut()
+
+
+    def _iter_optimize(self, bounds: SearchBounds) -> Iterator[List[str]]:
+        """
+        The objective is the number of faulty gates; the optimum only grows as diagnoses get blocked.
+        """
+        gates = self.retriever.all_gates
+        optimizer = self._new_solver(Optimize())
+        optimizer.minimize(Sum([If(gate, 1, 0) for gate in gates]))
+
+        while not bounds.exceeded(self.solver_calls) and self._check(optimizer) == sat:
+            diagnosis = self._diagnosis(optimizer.model())
+            if not diagnosis:
+                return  # the observations are consistent with all gates healthy
+            if bounds.max_size is not None and len(diagnosis) > bounds.max_size:
+                bounds.cut()  # all diagnoses left are larger than max_size
+                return
+            self._block(optimizer, diagnosis)
+            yield self._names(diagnosis)
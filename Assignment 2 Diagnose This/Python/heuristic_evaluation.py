@@ -1,16 +1,34 @@
 from heuristics import shortest_conflict_set_heuristic, middle_set_heuristic, longest_conflict_set_heuristic, most_common_set_heuristic
-from hittingsets import run_hitting_set_algorithm, HittingNode
+from hittingsets import run_hitting_set_algorithm, iter_minimal_hitting_sets, minimize_hitting_sets, NodeCounter, HittingNode
 from conflictsets import ConflictSetRetriever
+from diagnosiscache import resolve_cache
+from measurement import PhaseRecorder, export_rows, peak_rss_kb, summarize
 from os.path import join
 from statistics import mean, median
+import argparse
+import sys
+import tracemalloc
 
 
-def print_evaluation_summary(results, num_documents):
+def print_evaluation_summary(results, num_documents, solver_stats=None, cache=None):
     """Prints a formatted summary of the heuristic performances."""
     
     print("\n--- Heuristic Performance Summary ---")
     print(f"Evaluated on {num_documents} documents.\n")
 
+    if solver_stats:
+        calls = sum(calls for calls, _, _ in solver_stats)
+        seconds = sum(seconds for _, seconds, _ in solver_stats)
+        walked = [saved for _, _, saved in solver_stats if saved is not None]  # cached documents have none
+        print("Conflict set retrieval:")
+        print(f"  - Total Consistency Checks: {calls:,}")
+        print(f"  - Consistency Checks Saved: {sum(walked):,} (over {len(walked)} computed documents)")
+        print(f"  - Total Solver Time: {seconds:,.3f} s")
+        print(f"  - Queries/sec: {calls / seconds if seconds else 0:,.0f}")
+        if cache:
+            print(f"  - Cache: {cache.stats()}")
+        print("-" * 20)
+
     for name, data in results.items():
         nodes = data['nodes_created']
         print(f"Heuristic: '{name}'")
@@ -31,48 +49,230 @@ def print_evaluation_summary(results, num_documents):
 
     print("\n--- End of Evaluation ---")
 
+def print_timing_summary(rows, trials):
+    """
+    Prints percentiles over the measured trials of the time spent in every phase.
+    The times of a trial are added up over all documents first. Documents whose conflict sets came
+    from the cache are left out of the conflict set phase, their time is only a cache lookup.
+
+    Args:
+        rows (list[dict]): The measurements, one row per document, trial and heuristic.
+        trials (int): The number of measured trials.
+    """
+    def per_trial(key, heuristic=None, computed_only=False):
+        totals = [0.0] * trials
+        for row in rows:
+            if (heuristic is None or row['heuristic'] == heuristic) and not (computed_only and row['conflicts_cached']):
+                totals[row['trial']] += row[key]
+        return totals
+
+    def print_line(label, values, unit="ms", scale=1000.0):
+        stats = summarize([value * scale for value in values])
+        print(f"  - {label:<14} p50 {stats['p50']:10,.2f} | p90 {stats['p90']:10,.2f} | "
+              f"min {stats['min']:10,.2f} | max {stats['max']:10,.2f} {unit}".rstrip())
+
+    if not rows:
+        return
+    heuristics = list(dict.fromkeys(row['heuristic'] for row in rows))
+
+    print(f"\n--- Timing Summary ({trials} trial{'s' if trials != 1 else ''}, totals over all documents) ---")
+    print("Shared phases:")  # the same in the rows of every heuristic, so counted once
+    for phase in ("parse", "encode"):
+        print_line(phase, per_trial(f"{phase}_s", heuristics[0]))
+    cached = sum(1 for row in rows if row['heuristic'] == heuristics[0] and row['conflicts_cached'])
+    if cached < len(rows) // len(heuristics):
+        print_line("conflicts", per_trial('conflicts_s', heuristics[0], computed_only=True))
+        print_line("solver calls", per_trial('solver_calls', heuristics[0], computed_only=True), unit="", scale=1.0)
+    if cached:
+        print(f"  - {cached} document trials loaded their conflict sets from the cache and are left out of these")
+    for heuristic in heuristics:
+        print(f"Heuristic: '{heuristic}'")
+        print_line("hitting sets", per_trial('hitting_sets_s', heuristic))
+        print_line("minimize", per_trial('minimize_s', heuristic))
+        heuristic_rows = [row for row in rows if row['heuristic'] == heuristic]
+        peak = max(row['hitting_sets_peak_kb'] for row in heuristic_rows)
+        if peak:
+            nodes = sum(row['nodes_created'] for row in heuristic_rows)
+            traced = sum(row['hitting_sets_peak_kb'] for row in heuristic_rows) * 1024
+            baseline = sum(row['baseline_bytes_per_node'] * row['nodes_created'] for row in heuristic_rows)
+            print(f"  - {'peak traced':<14} {peak:,.0f} KB, {traced / nodes if nodes else 0:,.0f} bytes per node, "
+                  f"{baseline / nodes if nodes else 0:,.0f} before __slots__")
+    rss = peak_rss_kb()
+    if rss is not None:
+        print(f"Peak RSS of the process: {rss:,.0f} KB")
+    print("-" * 20)
+
+
+# Columns of the rows that are measured by the traced memory pass, see run_evaluation
+PEAK_COLUMNS = ('encode_peak_kb', 'conflicts_peak_kb', 'hitting_sets_peak_kb', 'bytes_per_node',
+                'baseline_bytes_per_node')
+
+# The node layout from before HittingNode got __slots__, as the baseline of the bytes per node:
+# the same methods, with the attributes in a __dict__, and discard() keeping every expanded level alive.
+BaselineHittingNode = type('BaselineHittingNode', (), dict(
+    {name: value for name, value in vars(HittingNode).items() if name not in HittingNode.__slots__ + ('__slots__',)},
+    discard=lambda self: None))
+
+
+def measure_document(doc_path, heuristics_to_test, cache=None):
+    """
+    Diagnoses one circuit with every heuristic and measures every phase.
+    The memory peaks are only measured while tracemalloc is tracing, and are 0 otherwise. While tracing,
+    the hitting sets are also searched with BaselineHittingNode to measure the bytes per node before __slots__.
+
+    Args:
+        doc_path (str): Path to the circuit file.
+        heuristics_to_test (list[callable]): Heuristic functions to evaluate.
+        cache (DiagnosisCache | None): Cache for the conflict sets, None to always compute them.
+
+    Returns:
+        tuple: The conflict set retriever and one row of measurements per heuristic.
+    """
+    phases = PhaseRecorder()
+    with phases.phase("encode"):
+        csr = ConflictSetRetriever(doc_path, cache=cache or False)
+    with phases.phase("conflicts"):
+        conflict_sets = csr.retrieve_conflict_sets("lattice")
+
+    shared = {
+        'document': doc_path,
+        'parse_s': csr.parse_time, 'encode_s': csr.encode_time,
+        'encode_peak_kb': phases.peak_kb.get("encode", 0.0),
+        'conflicts_s': phases.seconds["conflicts"], 'conflicts_peak_kb': phases.peak_kb.get("conflicts", 0.0),
+        'conflicts_cached': csr.cache_hit, 'solver_calls': csr.solver_calls, 'conflict_sets': len(conflict_sets),
+    }
+
+    rows = []
+    for heuristic in heuristics_to_test:
+        phases = PhaseRecorder()
+        counter = NodeCounter()
+        with phases.phase("hitting_sets"):
+            _, minimal_hitting_sets = run_hitting_set_algorithm(conflict_sets, heuristic, cache=False, counter=counter)
+        # The DAG already only yields minimal sets, this pass is timed as the cost of verifying that
+        with phases.phase("minimize"):
+            verified = minimize_hitting_sets(minimal_hitting_sets)
+        assert len(verified) == len(minimal_hitting_sets), f"{heuristic.__name__} found non-minimal hitting sets"
+        if tracemalloc.is_tracing():
+            baseline_counter = NodeCounter()
+            with phases.phase("baseline"):
+                list(iter_minimal_hitting_sets(conflict_sets, heuristic, counter=baseline_counter,
+                                               node_type=BaselineHittingNode))
+
+        rows.append(dict(shared, **{
+            'heuristic': heuristic.__name__,
+            'hitting_sets_s': phases.seconds["hitting_sets"],
+            'hitting_sets_peak_kb': phases.peak_kb.get("hitting_sets", 0.0),
+            'minimize_s': phases.seconds["minimize"],
+            'nodes_created': counter.nodes_created, 'diagnoses': len(minimal_hitting_sets),
+            'bytes_per_node': phases.peak_kb.get("hitting_sets", 0.0) * 1024 / max(counter.nodes_created, 1),
+            'baseline_bytes_per_node': phases.peak_kb.get("baseline", 0.0) * 1024 / max(counter.nodes_created, 1),
+            'peak_rss_kb': peak_rss_kb(),
+        }))
+    return csr, rows
+
+
+def add_memory_peaks(rows, document_paths, heuristics_to_test, cache=None):
+    """
+    Diagnoses every document once more with tracemalloc tracing and copies the memory peaks of
+    the phases into the rows of the same document and heuristic, leaving their times alone.
+
+    Args:
+        rows (list[dict]): The measurements of the untraced trials, updated in place.
+        document_paths (list[str]): List of paths to the circuit files.
+        heuristics_to_test (list[callable]): List of heuristic functions to evaluate.
+        cache (DiagnosisCache | None): Cache for the conflict sets, None to always compute them.
+    """
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for doc_path in document_paths:
+            for row in measure_document(doc_path, heuristics_to_test, cache)[1]:
+                peaks[row['document'], row['heuristic']] = {column: row[column] for column in PEAK_COLUMNS}
+    finally:
+        tracemalloc.stop()
+    for row in rows:
+        row.update(peaks[row['document'], row['heuristic']])
+
+
 # Advanced evaluation function
-def run_evaluation(document_paths, heuristics_to_test):
+def run_evaluation(document_paths, heuristics_to_test, trials=1, warmup=0, export_path=None, use_cache=False,
+                   trace_memory=True):
     """
     Runs the hitting set algorithm for multiple circuits and heuristics,
     then prints a summary of the performance.
 
+    Every trial diagnoses all documents with all heuristics. The warm-up trials run first and
+    are not measured, so imports, the solver and the caches of the interpreter are warm.
+    The trials run without tracemalloc, which slows down every allocation several times over.
+    The memory peaks come from one extra pass over the documents with tracemalloc on, whose times
+    are not used, and are copied into the rows of every trial.
+
     Args:
         document_paths (list[str]): List of paths to the circuit files.
         heuristics_to_test (list[callable]): List of heuristic functions to evaluate.
+        trials (int): Number of measured trials.
+        warmup (int): Number of unmeasured trials before them.
+        export_path (str | None): If given, the rows of measurements are written to this .csv or .json file.
+        use_cache (bool): Whether conflict sets may come from the on-disk cache. Off by default, so the
+                          conflict set phase is measured in every trial.
+        trace_memory (bool): Whether to measure the peak memory of the phases in a separate pass
+                             with tracemalloc. The times are not affected either way.
+
+    Returns:
+        list[dict]: The rows of measurements, one per document, measured trial and heuristic.
     """
     results = {}
+    solver_stats = []
+    rows = []
+    cache = resolve_cache(use_cache)
+
+    for trial in range(-warmup, trials):
+        for doc_path in document_paths:
+            csr, document_rows = measure_document(doc_path, heuristics_to_test, cache)
+            if trial < 0:
+                continue
+            for row in document_rows:
+                row['trial'] = trial
+            rows.extend(document_rows)
+            if trial > 0:
+                continue
+
+            solver_stats.append((csr.solver_calls, csr.solver_time, csr.solver_calls_saved))
+            if not document_rows[0]['conflict_sets']:
+                continue
 
-    for i, doc_path in enumerate(document_paths):
-        
-        # Retrieve conflict sets for the current document
-        csr = ConflictSetRetriever(doc_path)
-        conflict_sets = csr.retrieve_conflict_sets()
-
-        if not conflict_sets:
-            continue
-
-        # Run each heuristic on this set of conflicts
-        for heuristic in heuristics_to_test:
-            HittingNode.reset_counter()
-            _, minimal_hitting_sets = run_hitting_set_algorithm(conflict_sets, heuristic)
-            nodes = HittingNode.get_nodes_created()
-            
             # Save the results
-            heuristic_name = heuristic.__name__
-            if heuristic_name not in results:
-                results[heuristic_name] = {
-                    'nodes_created': [],
-                    'minimal_hitting_sets_found': []
-                }
-            results[heuristic_name]['nodes_created'].append(nodes)
-            results[heuristic_name]['minimal_hitting_sets_found'].append(len(minimal_hitting_sets))
+            for row in document_rows:
+                heuristic_name = row['heuristic']
+                if heuristic_name not in results:
+                    results[heuristic_name] = {
+                        'nodes_created': [],
+                        'minimal_hitting_sets_found': []
+                    }
+                results[heuristic_name]['nodes_created'].append(row['nodes_created'])
+                results[heuristic_name]['minimal_hitting_sets_found'].append(row['diagnoses'])
+
+    if trace_memory and rows:
+        add_memory_peaks(rows, document_paths, heuristics_to_test, cache)
 
     # Print the evaluation summary
-    print_evaluation_summary(results, len(document_paths))
+    print_timing_summary(rows, trials)
+    print_evaluation_summary(results, len(document_paths), solver_stats, cache)
+    if export_path and rows:
+        export_rows(rows, export_path)
+        print(f"Wrote {len(rows)} rows to {export_path}", file=sys.stderr)
+    return rows
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the heuristics of the hitting set algorithm")
+    parser.add_argument("--trials", type=int, default=1, help="number of measured trials")
+    parser.add_argument("--warmup", type=int, default=0, help="number of unmeasured trials before them")
+    parser.add_argument("--cache", action="store_true", help="load conflict sets computed by earlier runs from the cache")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip the traced pass that measures the peak memory of the phases")
+    parser.add_argument("-o", "--output", help="write the measurements to this .csv or .json file")
+    args = parser.parse_args()
+
     # List of documents to evaluate
     documents = ["circuit1.txt", "circuit2.txt", "circuit3.txt", "circuit4.txt", 
                  "circuit5.txt", "circuit6.txt", "circuit7.txt", "circuit8.txt"]
@@ -86,4 +286,5 @@ if __name__ == '__main__':
     ]
 
     # Run the advanced evaluation
-    run_evaluation([join("circuits", doc) for doc in documents], heuristics_to_compare)
\ No newline at end of file
+    run_evaluation([join("circuits", doc) for doc in documents], heuristics_to_compare, args.trials, args.warmup,
+                   args.output, args.cache, not args.no_tracemalloc)
@@ -1,3 +1,6 @@
+from bitsets import ConflictTable, bit_positions, nth_bit
+
+
 def shortest_conflict_set_heuristic(conflict_sets):
     """
     Heuristic: Choose the conflict set with the shortest length.
@@ -36,3 +39,167 @@ def most_common_set_heuristic(conflict_sets):
     for setthingy in conflict_sets:
         if list(sorted_dict.keys())[0] in setthingy:
             return setthingy
+
+
+# Incremental versions of the heuristics above, used by the hitting set DAG.
+# A child node only differs from its parent by the conflict sets its branch hits, so instead of
+# building the list of remaining conflict sets and scanning it for every node, each node keeps a
+# small state that is derived from the state of its parent by removing those conflict sets.
+
+class IncrementalHeuristic:
+    """
+    Selects the conflict set of a node from a state that is updated from parent to child.
+    This base class keeps no state and calls a plain heuristic function on the remaining conflict sets,
+    so any function that takes a list of conflict sets can still be used as a heuristic.
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.__name__ = function.__name__
+
+    def __call__(self, conflict_sets):
+        return self.function(conflict_sets)
+
+    def root_state(self, table: ConflictTable, remaining: int):
+        """
+        Args:
+            table (ConflictTable): the conflict sets of the DAG.
+            remaining (int): bitset of the conflict sets of the root.
+
+        Returns:
+            the state of the root node.
+        """
+        return None
+
+    def child_state(self, table: ConflictTable, state, remaining: int, removed: int):
+        """
+        Args:
+            table (ConflictTable): the conflict sets of the DAG.
+            state: the state of the parent, which is not changed.
+            remaining (int): bitset of the conflict sets left at the child.
+            removed (int): bitset of the conflict sets left at the parent that the branch hits.
+
+        Returns:
+            the state of the child node.
+        """
+        return None
+
+    def select(self, table: ConflictTable, state, remaining: int):
+        """
+        Args:
+            table (ConflictTable): the conflict sets of the DAG.
+            state: the state of the node.
+            remaining (int): bitset of the conflict sets left at the node.
+
+        Returns:
+            list: the selected conflict set, or None if there are none left.
+        """
+        return self.function(table.select(remaining)) if remaining else None
+
+
+def _lowest(table: ConflictTable, conflicts: int) -> list:
+    """The conflict set with the lowest index in a non-empty bitset of conflict sets."""
+    return table.conflict_sets[(conflicts & -conflicts).bit_length() - 1]
+
+
+class _SizeBuckets(IncrementalHeuristic):
+    """State: for every size, the bitset of the remaining conflict sets of that size."""
+
+    def root_state(self, table, remaining):
+        buckets = {}
+        for i in bit_positions(remaining):
+            size = table.masks[i].bit_count()
+            buckets[size] = buckets.get(size, 0) | 1 << i
+        return buckets
+
+    def child_state(self, table, state, remaining, removed):
+        return {size: bucket & ~removed for size, bucket in state.items() if bucket & ~removed}
+
+
+class ShortestConflictSet(_SizeBuckets):
+    """Incremental shortest_conflict_set_heuristic: the first conflict set of the smallest size."""
+
+    def select(self, table, state, remaining):
+        return _lowest(table, state[min(state)]) if state else None
+
+
+class LongestConflictSet(_SizeBuckets):
+    """Incremental longest_conflict_set_heuristic: the first conflict set of the largest size."""
+
+    def select(self, table, state, remaining):
+        return _lowest(table, state[max(state)]) if state else None
+
+
+class MiddleSet(IncrementalHeuristic):
+    """Incremental middle_set_heuristic: needs no state, the middle set bit is found directly."""
+
+    def select(self, table, state, remaining):
+        if not remaining:
+            return None
+        return table.conflict_sets[nth_bit(remaining, round((remaining.bit_count() - 1) / 2))]
+
+
+class MostCommonSet(IncrementalHeuristic):
+    """
+    Incremental most_common_set_heuristic.
+    State: for every frequency, the bitset of the components that are in that many remaining conflict sets.
+    Only the components of the removed conflict sets change frequency. The plain function picks the
+    first conflict set containing the most common component, where ties go to the component seen first,
+    which is the first remaining conflict set that contains any of the most common components.
+    """
+
+    def root_state(self, table, remaining):
+        buckets = {}
+        for position, hits in enumerate(table.component_hits):
+            frequency = (hits & remaining).bit_count()
+            if frequency:
+                buckets[frequency] = buckets.get(frequency, 0) | 1 << position
+        return buckets
+
+    def child_state(self, table, state, remaining, removed):
+        touched = 0
+        for i in bit_positions(removed):
+            touched |= table.masks[i]
+
+        buckets = dict(state)
+        for position in bit_positions(touched):
+            hits = table.component_hits[position]
+            old, new = (hits & (remaining | removed)).bit_count(), (hits & remaining).bit_count()
+            buckets[old] ^= 1 << position
+            if not buckets[old]:
+                del buckets[old]
+            if new:
+                buckets[new] = buckets.get(new, 0) | 1 << position
+        return buckets
+
+    def select(self, table, state, remaining):
+        if not state:
+            return None
+        candidates = 0
+        for position in bit_positions(state[max(state)]):
+            candidates |= table.component_hits[position]
+        return _lowest(table, candidates & remaining)
+
+
+_INCREMENTAL = {
+    shortest_conflict_set_heuristic: ShortestConflictSet(shortest_conflict_set_heuristic),
+    longest_conflict_set_heuristic: LongestConflictSet(longest_conflict_set_heuristic),
+    middle_set_heuristic: MiddleSet(middle_set_heuristic),
+    most_common_set_heuristic: MostCommonSet(most_common_set_heuristic),
+}
+
+
+def incremental(heuristic) -> IncrementalHeuristic:
+    """
+    Get the incremental version of a heuristic.
+
+    Args:
+        heuristic (callable): one of the heuristic functions above, any other function taking
+                              a list of conflict sets, or an IncrementalHeuristic.
+
+    Returns:
+        IncrementalHeuristic: the port of a known heuristic, otherwise a wrapper that calls the function.
+    """
+    if isinstance(heuristic, IncrementalHeuristic):
+        return heuristic
+    return _INCREMENTAL.get(heuristic) or IncrementalHeuristic(heuristic)
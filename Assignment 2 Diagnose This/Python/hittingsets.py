@@ -1,53 +1,165 @@
 from heuristics import shortest_conflict_set_heuristic, middle_set_heuristic, most_common_set_heuristic, longest_conflict_set_heuristic
+from heuristics import IncrementalHeuristic, incremental
+from bitsets import ComponentIndex, ConflictTable, SubsetIndex
+from bounds import SearchBounds
+from diagnosiscache import resolve_cache
 
 # Main hitting set algorithm
-def run_hitting_set_algorithm(conflict_sets, heuristic=shortest_conflict_set_heuristic) -> tuple[list, list]:
+def run_hitting_set_algorithm(conflict_sets, heuristic=shortest_conflict_set_heuristic,
+                              bounds: SearchBounds = None, cache=False, counter=None) -> tuple[list, list]:
     """
     Algorithm that handles the entire process from conflict sets to hitting sets.
+    Collects everything iter_minimal_hitting_sets produces, see there for how the HS-DAG is built.
 
     Args:
         conflict_sets (list): A list of conflict sets.
         heuristic (function): The heuristic function to use for selecting the next conflict set. 
                               Defaults to shortest_conflict_set_heuristic.
+        bounds (SearchBounds | None): Optional size, node and time limits. When one is hit, the minimal
+                                      hitting sets found so far are returned and bounds.complete is set to False.
+        cache (bool | DiagnosisCache): Optional on-disk cache for the minimal hitting sets, see resolve_cache.
+                                       Off by default. Only used without limits and without a counter,
+                                       since a cached result creates no nodes.
+        counter (NodeCounter | None): Optional counter of the nodes created by this run.
 
     Returns:
-        tuple: A tuple containing the list of hitting sets and minimal hitting sets.
+        tuple: The minimal hitting sets twice. The first element used to hold all hitting sets of the
+               fully built tree, but the DAG is discarded level by level and only yields minimal
+               hitting sets, so both elements are the same list. The pair is kept for existing callers.
     """
-    initial_conflict_set = heuristic(conflict_sets)
-    if not initial_conflict_set:
-        return [], []
+    cache = resolve_cache(cache) if (bounds is None or bounds.unbounded()) and counter is None else None
+    key = cache.diagnosis_key(conflict_sets, heuristic.__name__) if cache else None
+    minimal_hitting_sets = cache.get(key) if key else None
 
-    # Start the tree with the root node
-    root = HittingNode(initial_conflict_set, conflict_sets)
-    
-    # Create a list of nodes to be expanded (BFS)
-    nodes_to_expand = [root]
-
-    while nodes_to_expand:
-        # Get the first node in the queue
-        current_node = nodes_to_expand.pop(0)
+    if minimal_hitting_sets is None:
+        minimal_hitting_sets = list(iter_minimal_hitting_sets(conflict_sets, heuristic, bounds=bounds, counter=counter))
+        if key:
+            cache.put(key, minimal_hitting_sets)
+    return minimal_hitting_sets, minimal_hitting_sets
 
-        # If the node is terminal, we don't need to expand it further.
-        if current_node.is_terminal():
-            continue
 
-        # For each branch in the current node's conflict set, create a child.
-        for branch in current_node.get_branches():
-            current_node.add_child(branch, heuristic)
-
-            # Add the newly created child node to the queue to be processed.
-            nodes_to_expand.append(current_node.children[branch])
+def iter_minimal_hitting_sets(conflict_sets, heuristic=shortest_conflict_set_heuristic, max_size=None,
+                              bounds: SearchBounds = None, counter=None, node_type=None):
+    """
+    Generator that yields the minimal hitting sets (diagnoses) one at a time, in order of increasing size,
+    as the breadth-first expansion of the HS-DAG finds them. Stop iterating (e.g. with itertools.islice)
+    to get only the first k diagnoses without expanding the rest of the DAG.
+    The HS-DAG is built with:
+    - reuse: a node whose path label (the set of branches leading to it) equals that of an existing
+      node is not created again, the branch points to the existing node;
+    - closing: a branch whose path label is a superset of an already found hitting set is closed and
+      its node is never created, since breadth-first every hitting set found before it is at most as large;
+    - pruning: conflict sets that are a superset of another conflict set are removed beforehand,
+      they are hit by every set that hits the smaller one.
+    Internally, path labels are bitsets of components and every node keeps the conflict sets it still
+    has to hit as a bitset over a shared ConflictTable; the results are converted back to lists.
+    Only the level being expanded and the next one are kept in memory: every expanded node is
+    discarded once its level is done, so memory grows with the width of the DAG, not its size.
+    The heuristic selects the conflict set of every node from a state that is updated from the state
+    of its parent (see heuristics.IncrementalHeuristic), instead of rescanning the remaining conflict sets.
 
-    # Once the tree is fully expanded, collect the hitting sets.
-    hitting_sets = root.get_hitting_sets()
+    Args:
+        conflict_sets (list): A list of conflict sets.
+        heuristic (function): The heuristic function to use for selecting the next conflict set. 
+                              Defaults to shortest_conflict_set_heuristic.
+        max_size (int | None): If given, no hitting sets larger than this are searched for.
+        bounds (SearchBounds | None): Optional size, node and time limits. bounds.complete is set to False
+                                      when one of them stops the search before all hitting sets are found.
+        counter (NodeCounter | None): Optional counter of the nodes created by this run.
+        node_type (type | None): Class of the nodes, HittingNode by default. Only meant for measuring
+                                 other node layouts, see heuristic_evaluation.BaselineHittingNode.
+
+    Yields:
+        list: the next minimal hitting set.
+    """
+    bounds = bounds if bounds is not None else SearchBounds()
+    if bounds.max_size is not None:
+        max_size = bounds.max_size if max_size is None else min(max_size, bounds.max_size)
+
+    heuristic = incremental(heuristic)
+    conflict_sets = prune_conflict_sets(conflict_sets)
+    if not conflict_sets:
+        return
+
+    # Start the DAG with the root node
+    table = ConflictTable(conflict_sets)
+    remaining = table.all_conflicts()
+    state = heuristic.root_state(table, remaining)
+    initial_conflict_set = heuristic.select(table, state, remaining)
+    level = [(node_type or HittingNode)(initial_conflict_set, table, remaining, counter=counter, state=state)]
+    nodes_created = 1
+    found_index = SubsetIndex()
+
+    # Expand the DAG level by level (BFS)
+    depth = 0
+    while level:
+        if max_size is not None and depth >= max_size:
+            bounds.cut()  # the nodes left may still lead to larger hitting sets
+            return
+        # Path labels of the nodes of the next level, all of size depth + 1, so only nodes
+        # of the same level can be reused and the earlier levels need not be remembered.
+        next_nodes = {}
+        next_level = []
+        for current_node in level:
+            for branch in list(current_node.get_branches()):
+                path_mask = current_node.path_mask | table.components.bit(branch)
+
+                # Reuse the node with the same path label if it exists.
+                if path_mask in next_nodes:
+                    current_node.children[branch] = next_nodes[path_mask]
+                    continue
+
+                # Close the branch if it contains a hitting set that was already found.
+                if found_index.has_subset_of(path_mask):
+                    current_node.close_branch(branch)
+                    continue
+
+                if bounds.exceeded(nodes_created):
+                    return
+
+                current_node.add_child(branch, heuristic)
+                child = current_node.children[branch]
+                next_nodes[path_mask] = child
+                nodes_created += 1
+
+                if child.is_terminal():
+                    found_index.add(path_mask)
+                    yield table.components.to_components(path_mask)
+                else:
+                    next_level.append(child)
+
+        # The expanded level is not needed anymore, let it and everything above it be freed
+        for expanded_node in level:
+            expanded_node.discard()
+        level = next_level
+        depth += 1
+
+
+def prune_conflict_sets(conflict_sets) -> list:
+    """
+    Function to remove conflict sets that are a superset of another conflict set, keeping the order.
 
-    # Minimize the hitting sets
-    minimal_hitting_sets = minimize_hitting_sets(hitting_sets)
+    Args:
+        conflict_sets (list): A list of conflict sets.
 
-    return hitting_sets, minimal_hitting_sets
+    Returns:
+        list: The conflict sets that have no other conflict set as a subset, without duplicates.
+    """
+    components = ComponentIndex()
+    candidates = [components.to_mask(cs) for cs in conflict_sets]
+
+    # Visit the conflict sets from small to large, so every subset of a candidate is indexed before it.
+    kept = set()
+    minimal_index = SubsetIndex()
+    for i in sorted(range(len(candidates)), key=lambda i: candidates[i].bit_count()):
+        if not minimal_index.has_subset_of(candidates[i]):
+            minimal_index.add(candidates[i])
+            kept.add(i)
+    return [cs for i, cs in enumerate(conflict_sets) if i in kept]
 
 # Optimized algorithm to minimize hitting sets.
-# Instead of naively checking all subsets, we order the hitting sets by length only check new sets against the already confirmed minimal sets.
+# Instead of naively checking all subsets, we order the hitting sets by length only check new sets against the already confirmed minimal sets,
+# which are kept in a set-trie so a check only looks at the minimal sets that can fit inside the candidate.
 def minimize_hitting_sets(hitting_sets) -> list:
     """
     Function to minimize hitting sets.
@@ -60,40 +172,60 @@ def minimize_hitting_sets(hitting_sets) -> list:
     """
     # Sort candidates by length.
     sorted_hs = sorted(hitting_sets, key=len)
+    components = ComponentIndex()
     
     minimal_hs = []
+    minimal_index = SubsetIndex()
 
     for hs_candidate in sorted_hs:
-        is_minimal = True
-        candidate_set = set(hs_candidate)
+        candidate_mask = components.to_mask(hs_candidate)
 
         # Check if the candidate is a superset of any already-confirmed minimal set.
-        for minimal_set in minimal_hs:
-            if set(minimal_set).issubset(candidate_set):
-                is_minimal = False
-                break  # Found a subset, so candidate is not minimal.
-        
-        if is_minimal:
+        if not minimal_index.has_subset_of(candidate_mask):
             minimal_hs.append(hs_candidate)
+            minimal_index.add(candidate_mask)
             
     return minimal_hs
 
 
+class NodeCounter:
+    """Counts the nodes created by one run of the hitting set algorithm.
+    Unlike the class-level counter of HittingNode, it is not shared between runs, threads or heuristics.
+    """
+
+    def __init__(self):
+        self.nodes_created = 0
+
+
 # Tree Structure for Hitting Set Algorithm
 class HittingNode:
-    """A node in the hitting set tree."""
+    """A node in the hitting set DAG.
+    Nodes use __slots__ and keep no data of their own besides bitsets and references to shared
+    objects (the conflict table and the selected conflict set in it), so they stay small.
+    """
 
-    # Class variable to track number of nodes created for runtime analysis
+    __slots__ = ("parent", "counter", "table", "remaining", "state", "path_mask", "conflict_set", "children")
+
+    # Class variable to track number of nodes created for runtime analysis,
+    # shared by all runs; use a NodeCounter to count the nodes of a single run
     _nodes_created = 0
 
-    def __init__(self, conflict_set: list[list], conflict_sets_left: list[list], parent=None):
+    def __init__(self, conflict_set: list, table: ConflictTable, remaining: int, parent=None, branch=None,
+                 counter: NodeCounter | None = None, state=None):
         self.parent: HittingNode | None = parent
-        self.conflict_sets_left: list[list] = conflict_sets_left
+        self.counter: NodeCounter | None = parent.counter if parent else counter
+        self.table: ConflictTable = table
+        self.remaining: int = remaining  # bitset over the table of the conflict sets left to be hit
+        self.state = state  # state of the heuristic at this node
+        # bitset of the branches from the root to this node
+        self.path_mask: int = parent.path_mask | table.components.bit(branch) if parent else 0
         self.conflict_set: list = conflict_set
         self.children: dict[any, HittingNode | None] = {c:None for c in conflict_set} if conflict_set else {}
 
-        # Increment the node creation counter
+        # Increment the node creation counters
         HittingNode._nodes_created += 1
+        if self.counter is not None:
+            self.counter.nodes_created += 1
 
     @classmethod
     def get_nodes_created(cls):
@@ -105,28 +237,6 @@ class HittingNode:
         """Resets the node creation counter to zero."""
         cls._nodes_created = 0
     
-    def get_hitting_sets(self) -> list[list]:
-        """Collect all hitting sets assuming the tree is fully expanded.
-        Each hitting set is represented as a list of branch elements.
-
-        Returns:
-            list[list]: the hitting sets
-        """
-        # Base case: if terminal, return an empty hitting set
-        if self.is_terminal():
-            return [[]]
-        
-        # Recursive case: collect hitting sets from children
-        hitting_sets: list[list] = []
-        for conflict, child in self.children.items():
-            if child:
-                for hs in child.get_hitting_sets():
-                    hitting_sets.append([conflict] + hs)
-            else:
-                hitting_sets.append([conflict])
-
-        return hitting_sets
-    
     def get_branches(self):
         """Get the branches (keys) of this node.
 
@@ -141,7 +251,7 @@ class HittingNode:
         Returns:
             list: the conflict sets that are left to be hit at this node
         """
-        return self.conflict_sets_left
+        return self.table.select(self.remaining)
     
     def is_terminal(self) -> bool:
         """A node is terminal if all conflicts have been hit.
@@ -149,25 +259,41 @@ class HittingNode:
         Returns:
             bool: True if terminal, False otherwise
         """
-        return len(self.conflict_sets_left) == 0
+        return self.remaining == 0
+
+    def discard(self):
+        """Drops the links to the parent and children and the heuristic state of an expanded node,
+        so the levels of the DAG above the one being expanded can be freed.
+        """
+        self.parent = None
+        self.children = {}
+        self.state = None
+
+    def close_branch(self, branch: any):
+        """Closes a branch: its path contains a hitting set found before, so it gets no child.
+
+        Args:
+            branch (any): The element from this node's conflict set that defines the branch.
+        """
+        del self.children[branch]
 
-    def add_child(self, branch: any, heuristic: callable):
+    def add_child(self, branch: any, heuristic: IncrementalHeuristic):
         """Adds a child node by applying a heuristic.
 
-        This method calculates the remaining conflicts for the child
-        and uses the provided heuristic to select the child's own conflict set.
+        This method calculates the remaining conflicts for the child, updates the state
+        of the heuristic by the conflicts the branch hits and uses it to select the child's own conflict set.
 
         Args:
             branch (any): The element from the parent's conflict set that defines this child.
-            heuristic (callable): The function to select the next best conflict set.
+            heuristic (IncrementalHeuristic): The heuristic that selects the next best conflict set.
         """
-        # Calculate the child's specific list of remaining conflicts.
-        conflict_sets_left = [cs for cs in self.conflict_sets_left if branch not in cs]
+        # Calculate the child's specific remaining conflicts.
+        remaining = self.table.unhit(self.remaining, branch)
 
-        # Apply the heuristic to this new list to find the best conflict set for the child.
-        child_conflict_set = heuristic(conflict_sets_left)
+        # Update the heuristic state by the removed conflicts and select the best conflict set for the child.
+        state = heuristic.child_state(self.table, self.state, remaining, self.remaining & ~remaining)
+        child_conflict_set = heuristic.select(self.table, state, remaining)
 
         # Create the new child node with its own calculated data.
-        node = HittingNode(child_conflict_set, conflict_sets_left, self)
+        node = type(self)(child_conflict_set, self.table, remaining, self, branch, state=state)
         self.children[branch] = node
-        
\ No newline at end of file
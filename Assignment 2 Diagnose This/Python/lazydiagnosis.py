@@ -0,0 +1,120 @@
+from conflictsets import ConflictSetRetriever
+from bitsets import SubsetIndex, bit_positions
+from bounds import SearchBounds
+from typing import Iterator, List, Optional
+
+
+class LazyDiagnoser:
+    """
+    Diagnosis engine that computes conflict sets on demand while it builds the hitting set tree,
+    as in Reiter's formulation, instead of computing all minimal conflict sets first.
+    Every node only needs one conflict set that is disjoint from its path (the gates assumed faulty):
+    - a known conflict set is reused if one is disjoint from the path;
+    - otherwise the solver checks the gates outside the path. If they are consistent the path is a
+      diagnosis, if not the unsat core is shrunk to a minimal conflict set with QuickXplain.
+    The tree is expanded breadth-first with the same reuse and closing rules as the HS-DAG of
+    hittingsets, so the diagnoses come out minimal and in order of size. Since every conflict set
+    is minimal, Reiter's pruning rule for non-minimal labels is never needed.
+    Circuits with a huge number of conflict sets only pay for the ones the diagnoses actually need.
+    Sets are bitmasks, with gate i as bit i.
+    """
+    def __init__(self, retriever: ConflictSetRetriever):
+        """
+        :param retriever: retriever of the circuit, whose solver is used for the consistency checks.
+        """
+        self.retriever = retriever
+        self.conflicts: List[int] = []  # minimal conflict sets found so far
+        self.conflicts_reused = 0  # nodes labelled with a known conflict set instead of a solver call
+        self.nodes_created = 0
+
+
+    def diagnose(self, bounds: SearchBounds = None) -> List[List[str]]:
+        """
+        :param bounds: optional size, node and time limits. When one is hit, the diagnoses found so far
+                       are returned and bounds.complete is set to False.
+        :return: the minimal diagnoses as lists of gate names, smallest first.
+        """
+        return list(self.iter_diagnoses(bounds))
+
+
+    def iter_diagnoses(self, bounds: SearchBounds = None) -> Iterator[List[str]]:
+        """
+        Generator version of diagnose: yields every minimal diagnosis as soon as it is found,
+        so the search can be stopped after the first few.
+
+        :param bounds: optional size, node and time limits.
+        :return: iterator over the minimal diagnoses as lists of gate names.
+        """
+        bounds = bounds if bounds is not None else SearchBounds()
+        names = [str(gate) for gate in self.retriever.all_gates]
+        found = SubsetIndex()
+
+        level = [0]  # path labels of the nodes of the current depth
+        depth = 0
+        while level:
+            # At the last allowed depth a node only has to be checked, its conflict set would not be used
+            last_depth = bounds.max_size is not None and depth >= bounds.max_size
+            next_level = {}  # path labels of the next depth, a dict to reuse nodes and keep their order
+            for path in level:
+                # Close the node if a diagnosis of its own size was found after it was created
+                if found.has_subset_of(path):
+                    continue
+                if bounds.exceeded(self.nodes_created):
+                    return
+                self.nodes_created += 1
+
+                conflict = self.label(path, need_conflict=not last_depth)
+                if conflict is None:
+                    if path:  # an empty path is no diagnosis, the circuit works correctly
+                        found.add(path)
+                        yield [names[gate] for gate in bit_positions(path)]
+                    continue
+                if last_depth:
+                    bounds.cut()  # larger diagnoses below this node are not searched for
+                    continue
+
+                for gate in bit_positions(conflict):
+                    child = path | (1 << gate)
+                    # Reuse a node with the same path, close a path containing a diagnosis
+                    if child not in next_level and not found.has_subset_of(child):
+                        next_level[child] = None
+            level = list(next_level)
+            depth += 1
+
+
+    def label(self, path: int, need_conflict: bool = True) -> Optional[int]:
+        """
+        Finds the label of a node: a conflict set disjoint from its path, or None if there is none.
+
+        :param path: bitmask of the gates assumed faulty at the node.
+        :param need_conflict: if False, a conflict found by the solver is not minimized, only -1 is
+                              returned for it, which saves the QuickXplain checks.
+        :return: bitmask of a minimal conflict set disjoint from the path, or None if the path is a diagnosis.
+        """
+        # Reuse the smallest known conflict set that the path does not hit
+        known = min((conflict for conflict in self.conflicts if not conflict & path),
+                    key=int.bit_count, default=None)
+        if known is not None:
+            self.conflicts_reused += 1
+            return known
+
+        retriever = self.retriever
+        healthy = [gate for gate in range(len(retriever.all_gates)) if not path >> gate & 1]
+        if retriever.is_consistent(healthy):
+            return None
+        if not need_conflict:
+            return -1
+
+        conflict = sum(1 << gate for gate in retriever.quickxplain(retriever.last_core()))
+        self.conflicts.append(conflict)
+        return conflict
+
+
+    def conflict_sets(self) -> List[List[str]]:
+        """
+        :return: the minimal conflict sets computed so far as lists of gate names,
+                 ordered by size like the conflict set engines.
+        """
+        names = [str(gate) for gate in self.retriever.all_gates]
+        gates = sorted((bit_positions(conflict) for conflict in self.conflicts), key=lambda cs: (len(cs), cs))
+        return [[names[gate] for gate in cs] for cs in gates]
@@ -2,6 +2,10 @@ from circuitplotter import plot_circuit
 from guesscomponentsgame import choose_components, score_function
 from conflictsets import ConflictSetRetriever
 from hittingsets import run_hitting_set_algorithm
+from lazydiagnosis import LazyDiagnoser
+from directdiagnosis import DirectDiagnoser
+from probablediagnosis import most_probable_diagnoses, rank_diagnoses, read_priors
+from bounds import SearchBounds
 from os.path import join
 
 if __name__ == '__main__':
@@ -10,29 +14,94 @@ if __name__ == '__main__':
 
     game = True
 
+    # "powerset", "marco", "lattice", "lazy" (conflict sets computed during the diagnosis),
+    # "direct" or "maxsat" (diagnoses enumerated by the solver, without conflict sets)
+    engine = "lattice"
+
+    use_cache = True  # reuse conflict sets and diagnoses computed by earlier runs
+
+    # Limits for an anytime answer, None means unbounded
+    max_diagnosis_size = None  # e.g. 3 to only find diagnoses of up to 3 components
+    max_nodes = None  # per search: consistency checks for the conflict sets, nodes for the hitting sets
+    time_limit = None  # seconds for the whole diagnosis
+
+    # Rank the diagnoses by probability, with the failure priors of the PRIORS section of the
+    # circuit file, or of a side file with lines like X1=0.05 if priors_file is set
+    rank_by_probability = True
+    priors_file = None
+    top_k = 5  # number of most probable diagnoses to show, None for all
+
     if game:
         # If you play the game, choose conflict sets, compute hitting sets:
         plot_circuit(document)
         chosen_conflict_sets = choose_components()
         print("Your chosen conflict sets:", chosen_conflict_sets)
-        chosen_hitting_sets, chosen_minimal_hitting_sets = run_hitting_set_algorithm(chosen_conflict_sets)
-        print("Your hitting sets:", chosen_hitting_sets)
+        # The DAG only yields minimal hitting sets, both elements of the result are the same list
+        _, chosen_minimal_hitting_sets = run_hitting_set_algorithm(chosen_conflict_sets)
         print("Your minimal hitting sets:", chosen_minimal_hitting_sets, "\n")
 
     # Collect conflict sets:
-    csr = ConflictSetRetriever(join("circuits", document))
-    conflict_sets = csr.retrieve_conflict_sets()
-    print("Actual conflict sets:", conflict_sets)
+    bounds = SearchBounds(max_diagnosis_size, max_nodes, time_limit)
+    csr = ConflictSetRetriever(join("circuits", document), cache=use_cache)
+    if engine == "lazy":
+        # Conflict sets and diagnoses at once, only the conflict sets the diagnoses need are computed
+        diagnoser = LazyDiagnoser(csr)
+        minimal_hitting_sets = diagnoser.diagnose(bounds)
+        conflict_sets = diagnoser.conflict_sets()
+        print("Conflict sets used by the diagnosis:", conflict_sets)
+        print(f"Consistency checks: {csr.solver_calls} ({csr.queries_per_second():,.0f} queries/sec), "
+              f"conflict sets reused: {diagnoser.conflicts_reused}")
+    elif engine in ("direct", "maxsat"):
+        # Diagnoses straight from the solver, there are no conflict sets
+        diagnoser = DirectDiagnoser(csr, "cardinality" if engine == "direct" else "optimize")
+        _, minimal_hitting_sets = diagnoser.diagnose(bounds)
+        conflict_sets = []
+        print(f"Solver calls: {diagnoser.solver_calls}")
+    else:
+        conflict_sets = csr.retrieve_conflict_sets(engine, bounds)
+        print("Actual conflict sets:", conflict_sets)
+        if csr.cache_hit:
+            print("Conflict sets were loaded from the cache")
+        else:
+            print(f"Consistency checks: {csr.solver_calls} ({csr.queries_per_second():,.0f} queries/sec)")
+        if csr.solver_calls_saved is not None:
+            print(f"Consistency checks saved compared to the full powerset: {csr.solver_calls_saved}")
+
+        # Collect minimal hitting sets:
+        _, minimal_hitting_sets = run_hitting_set_algorithm(conflict_sets, bounds=bounds, cache=use_cache)
 
-    # Collect minimal hitting sets:
-    if len(conflict_sets) == 0:
+    if not minimal_hitting_sets and bounds.complete:
         print("This circuit works correctly, there are no faulty components!")
     else:
-        hitting_sets, minimal_hitting_sets = run_hitting_set_algorithm(conflict_sets)
-        print("Hitting sets:", hitting_sets)
-        print("Minimal hitting sets:", minimal_hitting_sets, "\n")
+        print("Minimal hitting sets:", minimal_hitting_sets)
+        if not bounds.complete:
+            print("Partial result: a size, node or time limit was reached before the search finished.")
+        print()
+
+    # Rank the diagnoses, most probable first:
+    if rank_by_probability and minimal_hitting_sets:
+        gates = csr.circuit.gate_names()
+        priors = read_priors(priors_file, gates) if priors_file else csr.circuit.priors
+        if conflict_sets and engine in ("powerset", "marco", "lattice") and bounds.complete:
+            # Best-first search over all conflict sets, stops after the top_k diagnoses
+            ranked = most_probable_diagnoses(conflict_sets, priors, top_k, components=gates)
+        else:
+            ranked = rank_diagnoses(minimal_hitting_sets, priors, top_k, components=gates)
+        total = sum(probability for _, probability in rank_diagnoses(minimal_hitting_sets, priors, components=gates))
+        print("Most probable diagnoses:")
+        for diagnosis, probability in ranked:
+            print(f"  - {diagnosis}: {probability / total:.1%} of the probability of the diagnoses found")
+        print()
 
     # Give score on similarity between the two sets:
     if game:
-        score = score_function(conflict_sets, chosen_conflict_sets)
-        print(f"Your score: {score:.2f}%")
\ No newline at end of file
+        # The lazy, direct and maxsat engines and a bounded search leave out conflict sets, the guess
+        # is scored against all of them, found with MARCO within the same node and time limits
+        scoring_bounds = SearchBounds(max_nodes=max_nodes, time_limit=time_limit)
+        if engine not in ("powerset", "marco", "lattice") or not bounds.complete:
+            conflict_sets = csr.retrieve_conflict_sets("marco", scoring_bounds)
+        if scoring_bounds.complete:
+            score = score_function(conflict_sets, chosen_conflict_sets)
+            print(f"Your score: {score:.2f}%")
+        else:
+            print("No score: not all conflict sets could be found within the node and time limits.")
\ No newline at end of file
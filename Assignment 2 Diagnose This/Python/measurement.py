@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional
+import csv
+import json
+import sys
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss_kb() -> Optional[float]:
+    """
+    :return: the peak resident set size of this process so far in KB, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == "darwin" else float(peak)  # bytes on macOS, KB on Linux
+
+
+class PhaseRecorder:
+    """
+    Measures named phases of a run: the wall time and, while tracemalloc is tracing,
+    the peak of the memory allocated by Python during the phase.
+    """
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.peak_kb: Dict[str, float] = {}
+
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Context manager that measures the code inside it as the phase name.
+        A phase that is measured more than once adds up its times and keeps its highest peak.
+
+        :param name: name of the phase.
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + perf_counter() - start
+            if tracing:
+                peak = max(0, tracemalloc.get_traced_memory()[1] - before) / 1024
+                self.peak_kb[name] = max(self.peak_kb.get(name, 0.0), peak)
+
+
+    def record(self, name: str, seconds: float):
+        """
+        Adds a phase that was timed elsewhere, e.g. by the retriever itself.
+
+        :param name: name of the phase.
+        :param seconds: its wall time.
+        """
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Percentile with linear interpolation between the closest ranks.
+
+    :param values: the measurements, at least one.
+    :param q: the percentile, between 0 and 100.
+    :return: the percentile of the values.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """
+    :param values: the measurements of a number of trials, at least one.
+    :return: the min, median, 90th percentile and max of the values.
+    """
+    return {"min": min(values), "p50": percentile(values, 50), "p90": percentile(values, 90), "max": max(values)}
+
+
+def export_rows(rows: List[Dict], path: str):
+    """
+    Writes rows of measurements as CSV or JSON, depending on the extension of the path.
+
+    :param rows: the measurements, all with the same keys.
+    :param path: output file ending in .csv or .json.
+    """
+    with open(path, "w", newline="") as file:
+        if path.endswith(".json"):
+            json.dump(rows, file, indent=2)
+        else:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,78 @@
+from hittingsets import minimize_hitting_sets, prune_conflict_sets
+from time import perf_counter
+import argparse
+import random
+
+
+def random_sets(count, num_components, min_size, max_size, rng) -> list[list]:
+    """
+    Generates random sets of component names.
+
+    Args:
+        count (int): number of sets.
+        num_components (int): number of different components.
+        min_size (int): smallest set size.
+        max_size (int): largest set size.
+        rng (random.Random): random number generator.
+
+    Returns:
+        list[list]: the sets, each a list of component names.
+    """
+    components = [f"C{i}" for i in range(num_components)]
+    return [rng.sample(components, rng.randint(min_size, max_size)) for _ in range(count)]
+
+
+def naive_minimize(sets) -> list:
+    """
+    The minimality filter without an index: every candidate is compared with every accepted set.
+
+    Args:
+        sets (list): A list of sets.
+
+    Returns:
+        list: The sets that have no other set as a subset.
+    """
+    minimal = []
+    for candidate in sorted(sets, key=len):
+        if not any(set(accepted).issubset(candidate) for accepted in minimal):
+            minimal.append(candidate)
+    return minimal
+
+
+def time_function(function, sets) -> tuple[float, int]:
+    """
+    Args:
+        function (callable): minimality filter to time.
+        sets (list): its input.
+
+    Returns:
+        tuple[float, int]: seconds taken and the number of sets that were kept.
+    """
+    start = perf_counter()
+    kept = function(sets)
+    return perf_counter() - start, len(kept)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the subset index used to keep only minimal sets')
+    parser.add_argument('--sets', type=int, default=20000, help='number of random sets per input')
+    parser.add_argument('--components', type=int, default=60, help='number of different components')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random number generator')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    inputs = {
+        # many raw hitting sets of a large diagnosis problem
+        "hitting sets": (minimize_hitting_sets, random_sets(args.sets, args.components, 2, 8, rng)),
+        # many conflict sets as returned by a non-minimal conflict set search
+        "conflict sets": (prune_conflict_sets, random_sets(args.sets, args.components, 3, 12, rng)),
+    }
+
+    print(f"{args.sets:,} random sets over {args.components} components\n")
+    for name, (function, sets) in inputs.items():
+        naive_seconds, naive_kept = time_function(naive_minimize, sets)
+        index_seconds, index_kept = time_function(function, sets)
+        assert naive_kept == index_kept, "The subset index kept a different number of sets"
+        print(f"Minimizing {name}: {index_kept:,} minimal")
+        print(f"  - Pairwise comparison: {naive_seconds:,.3f} s")
+        print(f"  - Subset index:        {index_seconds:,.3f} s ({naive_seconds / index_seconds:,.1f}x)")
@@ -0,0 +1,245 @@
+from conflictsets import ConflictSetRetriever
+from circuitgenerator import generate_circuit
+from bitsets import SubsetIndex, bit_positions
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from time import perf_counter
+from typing import Dict, List, Optional, Set, Tuple
+from os.path import join
+import argparse
+import os
+import tempfile
+
+
+# Retriever of the worker process, every worker has its own solver for the same circuit
+_retriever: Optional[ConflictSetRetriever] = None
+# Conflict sets and complements of maximal consistent sets known to the worker, see check_nodes
+_conflicts = SubsetIndex()
+_consistent = SubsetIndex()
+_known_applied = 0  # number of entries of the log of known sets of the parent added to them
+
+
+def _init_worker(document_path: str, backend: str):
+    """
+    Initializer of a worker process: reads the circuit and encodes it in the solver of the worker.
+
+    :param document_path: path to the circuit file.
+    :param backend: consistency backend of the retriever.
+    """
+    global _retriever
+    _retriever = ConflictSetRetriever(document_path, backend)
+
+
+def check_nodes(nodes: List[Tuple[int, int]], known_from: int, known: Tuple[Tuple[bool, int], ...]
+                ) -> Tuple[List[Tuple[int, int, bool, int]], int, int, int]:
+    """
+    Handles a chunk of nodes of the lattice search of ConflictSetRetriever.lattice_conflicts,
+    runs inside a worker process. Before every node, the conflict sets and maximal consistent sets
+    found so far are checked again, including those this worker found for the earlier nodes of the
+    chunk, so a node that got covered after it was handed out costs no consistency check:
+    - a node that contains a known conflict set is dropped;
+    - a node inside a known maximal consistent set returns that set without a check;
+    - otherwise an inconsistent node is shrunk to a minimal conflict set and a consistent one is
+      grown to a maximal consistent set, first with the gates it may still add.
+
+    :param nodes: (gates assumed healthy, gates that may still be added) as bitmasks, with gate i as bit i.
+    :param known_from: position of the first entry of known in the log of known sets of the parent,
+                       at most the number of entries every worker has already added.
+    :param known: the log of the known sets of the parent from known_from on, as (is conflict, bitmask)
+                  pairs with a maximal consistent set as its complement. The worker adds the entries it has not seen yet.
+    :return: for every node that was not dropped the node, whether a conflict set was found and the
+             conflict set or the maximal consistent set, the number of consistency checks, and the
+             process id of the worker with the number of entries of the log it has added.
+    """
+    global _known_applied
+    for is_conflict, mask in known[_known_applied - known_from:]:
+        (_conflicts if is_conflict else _consistent).add(mask)
+    _known_applied = max(_known_applied, known_from + len(known))
+
+    calls = _retriever.solver_calls
+    full = (1 << len(_retriever.all_gates)) - 1
+    results = []
+    for mask, allowed in nodes:
+        if _conflicts.has_subset_of(mask):
+            continue
+        outside = _consistent.find_subset_of(full & ~mask)
+        if outside is not None:
+            results.append((mask, allowed, False, full & ~outside))
+        elif not _retriever.is_consistent(_retriever.mask_to_gates(mask)):
+            conflict = sum(1 << gate for gate in _retriever.quickxplain(_retriever.last_core()))
+            _conflicts.add(conflict)
+            results.append((mask, allowed, True, conflict))
+        else:
+            grown = _retriever.grow_consistent(mask, bit_positions(allowed) + bit_positions(full & ~allowed))
+            _consistent.add(full & ~grown)
+            results.append((mask, allowed, False, grown))
+    return results, _retriever.solver_calls - calls, os.getpid(), _known_applied
+
+
+class ParallelConflictSetRetriever:
+    """
+    Finds the minimal conflict sets with a pool of worker processes, each with its own solver.
+    The search is the one of the lattice engine of ConflictSetRetriever: nodes are a set of gates
+    with the gates that may still be added, and a consistent node only gets children for the gates
+    outside its maximal consistent set. Here the open nodes form a stack that the workers take
+    chunks from, so only the frontier of the search is ever kept, never the whole lattice.
+    Conflict sets and maximal consistent sets found by any worker are collected here. Nodes are
+    filtered against them when they are handed out and again by the worker just before each check,
+    and a node that is inside a known maximal consistent set is expanded here without a check.
+    Only a worker's own results and the log of known sets up to its task are available to it, so
+    concurrent workers can still find the same set twice; with one worker and chunks of one node
+    the checks are exactly those of the sequential engine.
+    """
+    def __init__(self, document_path: str, workers: Optional[int] = None, backend: str = "z3",
+                 chunk_size: int = 1):
+        """
+        :param document_path: path to the circuit file.
+        :param workers: number of worker processes, the number of cores by default.
+        :param backend: consistency backend of the workers.
+        :param chunk_size: nodes per task.
+        """
+        self.document_path = document_path
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.gate_names = ConflictSetRetriever(document_path, backend).circuit.gate_names()
+        self.solver_calls = 0
+
+
+    def retrieve_conflict_sets(self) -> List[List[str]]:
+        """
+        :return: the minimal conflict sets as lists of gate names, ordered like the other engines.
+        """
+        n = len(self.gate_names)
+        self._full = (1 << n) - 1
+        self._conflicts = SubsetIndex()
+        self._consistent = SubsetIndex()  # complements of the maximal consistent sets
+        self._known: List[Tuple[bool, int]] = []  # every set added to the two indices, in order
+        applied: Dict[int, int] = {}  # entries of the log every worker process has added, by process id
+        minimal_conflicts: List[int] = []
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.document_path, self.backend)) as executor:
+            stack: List[Tuple[int, int]] = [(0, self._full)]
+            in_flight: Set[Future] = set()
+            while stack or in_flight:
+                while stack and len(in_flight) < self.workers:
+                    chunk = self._take_chunk(stack)
+                    if chunk:
+                        # Only the part of the log that some worker may not have added yet is sent
+                        known_from = min(applied.values()) if len(applied) == self.workers else 0
+                        in_flight.add(executor.submit(check_nodes, chunk, known_from, tuple(self._known[known_from:])))
+                if not in_flight:
+                    continue
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results, calls, pid, worker_applied = future.result()
+                    self.solver_calls += calls
+                    applied[pid] = max(applied.get(pid, 0), worker_applied)
+                    for mask, allowed, is_conflict, found in results:
+                        if is_conflict:
+                            if not self._conflicts.has_subset_of(found):  # another node found it as well
+                                self._add(True, found)
+                                minimal_conflicts.append(found)
+                        else:
+                            if not self._consistent.has_subset_of(self._full & ~found):
+                                self._add(False, self._full & ~found)
+                            stack.extend(self._children(mask, allowed, found))
+
+        gates = [[gate for gate in range(n) if mask >> gate & 1] for mask in minimal_conflicts]
+        return [[self.gate_names[gate] for gate in cs] for cs in sorted(gates, key=lambda cs: (len(cs), cs))]
+
+
+    def _add(self, is_conflict: bool, mask: int):
+        """
+        :param is_conflict: whether mask is a conflict set or the complement of a maximal consistent set.
+        :param mask: the set.
+        """
+        (self._conflicts if is_conflict else self._consistent).add(mask)
+        self._known.append((is_conflict, mask))
+
+
+    @staticmethod
+    def _children(mask: int, allowed: int, consistent: int) -> List[Tuple[int, int]]:
+        """
+        :param mask: gates of a consistent node.
+        :param allowed: gates the node may still add.
+        :param consistent: a maximal consistent set containing the node.
+        :return: the children of the node, in reverse so the one with the lowest gate is taken first.
+        """
+        children = []
+        for gate in bit_positions(allowed & ~consistent):
+            allowed &= ~(1 << gate)
+            children.append((mask | (1 << gate), allowed))
+        return children[::-1]
+
+
+    def _take_chunk(self, stack: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Takes the next chunk of nodes that need a check from the stack. Nodes containing a known
+        conflict set are dropped, and nodes inside a known maximal consistent set are expanded right away.
+
+        :param stack: open nodes.
+        :return: up to chunk_size nodes.
+        """
+        chunk = []
+        while stack and len(chunk) < self.chunk_size:
+            mask, allowed = stack.pop()
+            if self._conflicts.has_subset_of(mask):
+                continue
+            outside = self._consistent.find_subset_of(self._full & ~mask)
+            if outside is not None:
+                stack.extend(self._children(mask, allowed, self._full & ~outside))
+            else:
+                chunk.append((mask, allowed))
+        return chunk
+
+
+def benchmark(document_paths: List[str], core_counts: List[int]) -> Dict[str, Dict[int, float]]:
+    """
+    Times the parallel retrieval for every number of worker processes and prints the speedup and
+    the consistency checks compared to the sequential lattice engine. The results have to be equal,
+    and a single worker has to make as many checks as the sequential engine.
+
+    :param document_paths: circuit files.
+    :param core_counts: numbers of worker processes to try.
+    :return: for every circuit the seconds per number of workers.
+    """
+    timings = {}
+    for path in document_paths:
+        start = perf_counter()
+        csr = ConflictSetRetriever(path, cache=False)
+        reference = csr.retrieve_conflict_sets("lattice")
+        sequential = perf_counter() - start
+        print(f"{path}: {len(csr.circuit.gates)} gates, {len(reference)} conflict sets, "
+              f"sequential {sequential:,.3f} s ({csr.solver_calls:,} checks)")
+
+        timings[path] = {}
+        for workers in core_counts:
+            start = perf_counter()
+            retriever = ParallelConflictSetRetriever(path, workers)
+            assert retriever.retrieve_conflict_sets() == reference, "Parallel result differs from the lattice engine"
+            timings[path][workers] = perf_counter() - start
+            assert workers > 1 or retriever.solver_calls == csr.solver_calls, \
+                "A single worker should make the checks of the lattice engine"
+            print(f"  - {workers} workers: {timings[path][workers]:,.3f} s ({retriever.solver_calls:,} checks, "
+                  f"{retriever.solver_calls / max(csr.solver_calls, 1):,.2f}x sequential), "
+                  f"speedup {sequential / timings[path][workers]:,.2f}x")
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark parallel conflict set retrieval against the number of cores")
+    parser.add_argument("--cores", type=int, nargs="+", default=None, help="worker counts, 1 to all cores by default")
+    parser.add_argument("--generated", type=int, nargs="*", default=[14, 16, 18],
+                        help="gate counts of the generated circuits to add")
+    args = parser.parse_args()
+
+    cores = args.cores or sorted({1, 2, 4, os.cpu_count() or 1})
+    paths = [join("circuits", f"circuit{i}.txt") for i in range(1, 9)]
+    with tempfile.TemporaryDirectory() as directory:
+        for num_gates in args.generated:
+            path = join(directory, f"generated{num_gates}.txt")
+            with open(path, "w") as file:
+                file.write(generate_circuit(num_gates, num_faults=2, seed=num_gates))
+            paths.append(path)
+        benchmark(paths, cores)
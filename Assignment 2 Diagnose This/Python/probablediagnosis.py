@@ -0,0 +1,153 @@
+from circuit import MAX_PRIOR, parse_priors
+from bitsets import ConflictTable, SubsetIndex, bit_positions
+from bounds import SearchBounds
+from heuristics import shortest_conflict_set_heuristic, incremental
+from hittingsets import prune_conflict_sets
+from itertools import count, islice
+from math import log, prod
+from typing import Dict, Iterator, List, Optional, Tuple
+import heapq
+
+
+# Failure probability of a component without a prior
+DEFAULT_PRIOR = 0.01
+
+
+def read_priors(path: str, components) -> Dict[str, float]:
+    """
+    Reads failure priors from a side file, with one line per component like the PRIORS section of a
+    circuit file, e.g. X1=0.05. Empty lines and lines starting with # are skipped.
+    The priors are validated like the PRIORS section, see circuit.parse_priors.
+
+    :param path: path to the priors file.
+    :param components: names of the components of the circuit.
+    :return: the prior failure probability of every component in the file.
+    """
+    with open(path, "r") as file:
+        lines = [line.strip() for line in file]
+    return parse_priors([line for line in lines if line and not line.startswith("#")], components)
+
+
+def diagnosis_probability(diagnosis: List[str], priors: Dict[str, float], components: List[str],
+                          default: float = DEFAULT_PRIOR) -> float:
+    """
+    Prior probability that exactly the components of a diagnosis are faulty, assuming that components
+    fail independently. Since every diagnosis explains the observations, its posterior probability is
+    this value divided by the same normalizing constant for all diagnoses.
+
+    :param diagnosis: the faulty components.
+    :param priors: failure probability per component.
+    :param components: all components that are taken into account, the others are left out of the product.
+    :param default: failure probability of a component without a prior.
+    :return: the probability.
+    """
+    faulty = set(diagnosis)
+    return prod(priors.get(c, default) if c in faulty else 1 - priors.get(c, default) for c in components)
+
+
+def rank_diagnoses(diagnoses: List[List[str]], priors: Dict[str, float], k: Optional[int] = None,
+                   default: float = DEFAULT_PRIOR,
+                   components: Optional[List[str]] = None) -> List[Tuple[List[str], float]]:
+    """
+    Orders diagnoses that are already known, e.g. from the lazy or direct engines, by probability.
+
+    :param diagnoses: the minimal diagnoses.
+    :param priors: failure probability per component.
+    :param k: if given, only the k most probable diagnoses are returned.
+    :param default: failure probability of a component without a prior.
+    :param components: all components of the circuit, the components of the diagnoses by default.
+    :return: (diagnosis, probability) pairs, most probable first, see diagnosis_probability.
+    """
+    if components is None:
+        components = list(dict.fromkeys(c for diagnosis in diagnoses for c in diagnosis))
+    ranked = sorted(((diagnosis, diagnosis_probability(diagnosis, priors, components, default))
+                     for diagnosis in diagnoses), key=lambda pair: -pair[1])
+    return ranked[:k] if k is not None else ranked
+
+
+def iter_probable_diagnoses(conflict_sets: List[List[str]], priors: Dict[str, float],
+                            default: float = DEFAULT_PRIOR, heuristic=shortest_conflict_set_heuristic,
+                            bounds: SearchBounds = None,
+                            components: Optional[List[str]] = None) -> Iterator[Tuple[List[str], float]]:
+    """
+    Best-first (uniform-cost) search over the hitting set DAG: yields the minimal diagnoses in order
+    of decreasing probability, so the most probable ones come out without building the whole DAG.
+
+    The cost of a node is the sum of -log(p / (1 - p)) over the components on its path, which orders
+    nodes by the probability of their path being exactly the faulty components. With priors below 0.5
+    every component has a positive cost, so every proper subset of a hitting set is cheaper and is
+    popped before it. A hitting set that contains no diagnosis found before is therefore minimal,
+    and the closing and reuse rules of the breadth-first HS-DAG still apply.
+
+    :param conflict_sets: the minimal conflict sets, all of them: with only some, a hitting set
+                          need not be a diagnosis.
+    :param priors: failure probability per component, all below 0.5.
+    :param default: failure probability of a component without a prior.
+    :param heuristic: selects the conflict set of every node, see heuristics.
+    :param bounds: optional size, node and time limits, nodes are the pushed nodes.
+    :param components: all components of the circuit, the components of the conflict sets by default.
+                       Components outside the conflict sets are healthy in every diagnosis, so they
+                       scale all probabilities by the same factor.
+    :return: iterator over (diagnosis, probability) pairs, see diagnosis_probability.
+    """
+    bounds = bounds if bounds is not None else SearchBounds()
+    if not conflict_sets:
+        return
+
+    table = ConflictTable(prune_conflict_sets(conflict_sets))
+    probabilities = [priors.get(c, default) for c in table.components.components]
+    for component, p in zip(table.components.components, probabilities):
+        if not 0 < p < MAX_PRIOR:
+            raise ValueError(f"Prior of {component} must be between 0 and {MAX_PRIOR} to rank diagnoses, not {p}")
+    costs = [-log(p / (1 - p)) for p in probabilities]
+    all_healthy = prod(1 - priors.get(c, default) for c in components or table.components.components)
+
+    heuristic = incremental(heuristic)
+    remaining = table.all_conflicts()
+    tiebreak = count()  # equal costs are expanded in the order they were pushed
+    queue = [(0.0, next(tiebreak), 0, remaining, heuristic.root_state(table, remaining))]
+    seen = {0}  # path labels of the nodes that were created
+    found = SubsetIndex()
+
+    while queue:
+        cost, _, path, remaining, state = heapq.heappop(queue)
+        # Close the node if a diagnosis inside its path was found after it was created
+        if found.has_subset_of(path):
+            continue
+        if remaining == 0:
+            found.add(path)
+            yield table.components.to_components(path), all_healthy * prod(
+                probabilities[c] / (1 - probabilities[c]) for c in bit_positions(path))
+            continue
+        if bounds.max_size is not None and path.bit_count() >= bounds.max_size:
+            bounds.cut()  # diagnoses below this node are larger than max_size
+            continue
+
+        for component in heuristic.select(table, state, remaining):
+            bit = table.components.bit(component)
+            child = path | bit
+            if child in seen or found.has_subset_of(child):
+                continue
+            if bounds.exceeded(len(seen)):
+                return
+            seen.add(child)
+            child_remaining = table.unhit(remaining, component)
+            child_state = heuristic.child_state(table, state, child_remaining, remaining & ~child_remaining)
+            heapq.heappush(queue, (cost + costs[bit.bit_length() - 1], next(tiebreak), child,
+                                   child_remaining, child_state))
+
+
+def most_probable_diagnoses(conflict_sets: List[List[str]], priors: Dict[str, float], k: Optional[int] = None,
+                            default: float = DEFAULT_PRIOR, bounds: SearchBounds = None,
+                            components: Optional[List[str]] = None) -> List[Tuple[List[str], float]]:
+    """
+    :param conflict_sets: the minimal conflict sets.
+    :param priors: failure probability per component, all below 0.5.
+    :param k: if given, the search stops after the k most probable diagnoses.
+    :param default: failure probability of a component without a prior.
+    :param bounds: optional size, node and time limits.
+    :param components: all components of the circuit, see iter_probable_diagnoses.
+    :return: (diagnosis, probability) pairs, most probable first, see iter_probable_diagnoses.
+    """
+    return list(islice(iter_probable_diagnoses(conflict_sets, priors, default, bounds=bounds,
+                                               components=components), k))
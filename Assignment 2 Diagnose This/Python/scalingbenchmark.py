@@ -0,0 +1,172 @@
+from circuit import parse_circuit
+from circuitgenerator import generate_circuit
+from conflictsets import ConflictSetRetriever
+from hittingsets import run_hitting_set_algorithm, NodeCounter
+from lazydiagnosis import LazyDiagnoser
+from directdiagnosis import DirectDiagnoser
+from bounds import SearchBounds
+from measurement import export_rows
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+from os.path import join
+import argparse
+import sys
+import tempfile
+import tracemalloc
+
+
+ENGINES = ("powerset", "marco", "lattice", "lazy", "direct", "maxsat")
+# Columns of the rows that are measured by the traced memory pass, see run_sweep
+PEAK_COLUMNS = ("parse_peak_kb", "encode_peak_kb", "conflicts_peak_kb", "hitting_sets_peak_kb")
+
+
+def measure(function: Callable) -> Tuple[object, float, int]:
+    """
+    Runs a phase and measures it.
+
+    :param function: the phase, without arguments.
+    :return: its result, the wall time in seconds and the peak of the memory allocated by Python during the phase,
+             which is 0 unless tracemalloc is tracing.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = perf_counter()
+    result = function()
+    seconds = perf_counter() - start
+    return result, seconds, max(0, tracemalloc.get_traced_memory()[1] - before) if tracing else 0
+
+
+def benchmark_circuit(path: str, engine: str, time_limit: float) -> Dict:
+    """
+    Diagnoses a circuit file with one engine and measures every phase.
+
+    :param path: path to the circuit file.
+    :param engine: conflict set engine, "lazy" to compute the conflict sets during the hitting set search,
+                   or "direct"/"maxsat" to enumerate the diagnoses with the solver.
+    :param time_limit: max seconds for the conflict sets and for the hitting sets each.
+    :return: a row with the measurements.
+    """
+    with open(path, "r") as file:
+        document = file.read()
+    circuit, parse_seconds, parse_memory = measure(lambda: parse_circuit(document))
+    csr, encode_seconds, encode_memory = measure(lambda: ConflictSetRetriever(path, cache=False))
+
+    conflict_bounds = SearchBounds(time_limit=time_limit)
+    hitting_bounds = SearchBounds(time_limit=time_limit)
+    if engine == "lazy":
+        # No separate conflict set phase, the conflict sets are computed while the hitting sets are searched
+        diagnoser = LazyDiagnoser(csr)
+        conflict_seconds = conflict_memory = 0
+        diagnoses, hitting_seconds, hitting_memory = measure(lambda: diagnoser.diagnose(hitting_bounds))
+        conflict_bounds.complete = hitting_bounds.complete
+        conflict_sets, nodes_created = diagnoser.conflicts, diagnoser.nodes_created
+    elif engine in ("direct", "maxsat"):
+        # Diagnoses straight from the solver, without conflict sets
+        diagnoser = DirectDiagnoser(csr, "cardinality" if engine == "direct" else "optimize")
+        conflict_seconds = conflict_memory = 0
+        (_, diagnoses), hitting_seconds, hitting_memory = measure(lambda: diagnoser.diagnose(hitting_bounds))
+        conflict_bounds.complete = hitting_bounds.complete
+        conflict_sets, nodes_created = [], 0
+        csr.solver_calls = diagnoser.solver_calls
+    else:
+        conflict_sets, conflict_seconds, conflict_memory = measure(
+            lambda: csr.retrieve_conflict_sets(engine, conflict_bounds))
+
+        counter = NodeCounter()
+        (_, diagnoses), hitting_seconds, hitting_memory = measure(
+            lambda: run_hitting_set_algorithm(conflict_sets, bounds=hitting_bounds, cache=False, counter=counter))
+        nodes_created = counter.nodes_created
+
+    return {
+        "gates": len(circuit.gates), "engine": engine,
+        "parse_s": parse_seconds, "parse_peak_kb": parse_memory / 1024,
+        "encode_s": encode_seconds, "encode_peak_kb": encode_memory / 1024,
+        "conflicts_s": conflict_seconds, "conflicts_peak_kb": conflict_memory / 1024,
+        "solver_calls": csr.solver_calls, "conflict_sets": len(conflict_sets),
+        "conflicts_complete": conflict_bounds.complete,
+        "hitting_sets_s": hitting_seconds, "hitting_sets_peak_kb": hitting_memory / 1024,
+        "nodes_created": nodes_created, "diagnoses": len(diagnoses),
+        "hitting_sets_complete": hitting_bounds.complete,
+    }
+
+
+def run_sweep(sizes: List[int], engines: List[str], seeds: int, time_limit: float, generator_options: Dict,
+              trace_memory: bool = True) -> List[Dict]:
+    """
+    Generates circuits of every size and benchmarks every engine on them.
+    An engine is not run on larger circuits once it hit the time limit on a smaller one.
+    The timed run is not traced, since tracemalloc slows down every allocation several times over.
+    The memory peaks come from a second run of the same circuit and engine with tracemalloc on.
+
+    :param sizes: gate counts to generate.
+    :param engines: conflict set engines to compare.
+    :param seeds: number of generated circuits per size.
+    :param time_limit: max seconds per phase.
+    :param generator_options: keyword arguments for generate_circuit.
+    :param trace_memory: whether to measure the memory peaks in a traced second run.
+    :return: a row for every circuit and engine.
+    """
+    rows = []
+    stopped = set()
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for seed in range(seeds):
+                path = join(directory, f"generated_{size}_{seed}.txt")
+                with open(path, "w") as file:
+                    file.write(generate_circuit(size, seed=seed, **generator_options))
+
+                for engine in engines:
+                    if engine in stopped:
+                        continue
+                    row = benchmark_circuit(path, engine, time_limit)
+                    row["seed"] = seed
+                    if trace_memory:
+                        tracemalloc.start()
+                        try:
+                            traced = benchmark_circuit(path, engine, time_limit)
+                        finally:
+                            tracemalloc.stop()
+                        row.update((column, traced[column]) for column in PEAK_COLUMNS)
+                    rows.append(row)
+                    print_row(row)
+                    if not row["conflicts_complete"]:
+                        stopped.add(engine)
+    return rows
+
+
+def print_row(row: Dict):
+    """
+    :param row: measurements of one circuit and engine.
+    """
+    conflicts = f"{row['conflict_sets']}{'' if row['conflicts_complete'] else '+'}"
+    diagnoses = f"{row['diagnoses']}{'' if row['hitting_sets_complete'] else '+'}"
+    print(f"{row['gates']:>5} {row['engine']:>9} {row['seed']:>4} | "
+          f"parse {row['parse_s'] * 1000:7.2f} ms | encode {row['encode_s'] * 1000:7.2f} ms | "
+          f"conflicts {row['conflicts_s']:8.3f} s {row['solver_calls']:>7} checks {conflicts:>5} sets "
+          f"{row['conflicts_peak_kb']:8.0f} KB | "
+          f"hitting sets {row['hitting_sets_s']:8.3f} s {row['nodes_created']:>7} nodes {diagnoses:>6} diagnoses "
+          f"{row['hitting_sets_peak_kb']:8.0f} KB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure how the diagnosis engines scale with the circuit size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 15, 20, 25, 30, 40, 50])
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--seeds", type=int, default=2, help="generated circuits per size")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="max seconds per phase")
+    parser.add_argument("--faults", type=int, default=2, help="faulty gates per circuit")
+    parser.add_argument("--depth", type=int, default=None, help="number of layers of gates")
+    parser.add_argument("--fan-out", type=int, default=None, help="max inputs fed by one gate")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip the traced runs that measure the memory peaks")
+    parser.add_argument("-o", "--output", help="write the measurements to this .csv or .json file")
+    args = parser.parse_args()
+
+    options = {"num_faults": args.faults, "depth": args.depth, "max_fan_out": args.fan_out}
+    print("A + after a count means the phase hit the time limit, larger circuits are skipped for that engine.")
+    measurements = run_sweep(args.sizes, args.engines, args.seeds, args.time_limit, options,
+                             not args.no_tracemalloc)
+    if args.output and measurements:
+        export_rows(measurements, args.output)
+        print(f"Wrote {len(measurements)} rows to {args.output}", file=sys.stderr)